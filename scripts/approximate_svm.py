@@ -0,0 +1,64 @@
+'''Approximate RBF SVM for large training sets.
+
+The RBF kernel is approximated with explicit features (Nystroem or random Fourier features) and a linear SVM
+is fitted on them, so the fit grows linearly with the number of rows instead of quadratically like SVC.
+The estimator has the C and gamma parameters of SVC, so it can replace it inside OneVsRestClassifier and
+OneVsOneClassifier (and in the grids of tuning.py) without other changes.
+'''
+
+import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, ClassifierMixin
+
+SVM_MODES = ['exact', 'nystroem', 'rff']
+
+class ApproximateRBFSVC(BaseEstimator, ClassifierMixin):
+    """
+    Linear SVM on Nystroem or random Fourier features of the RBF kernel
+
+    Parameters:
+    C -- (float) regularization of the linear SVM
+    gamma -- (float or 'scale') RBF kernel coefficient, 'scale' uses 1 / (n_features * X.var()) as SVC does
+    method -- (string) 'nystroem' or 'rff'
+    n_components -- (int) number of features of the approximation
+    class_weight -- (dict or 'balanced') class weights of the linear SVM
+    random_state -- (int) seed of the approximation
+    """
+
+    def __init__(self, C=1.0, gamma='scale', method='nystroem', n_components=300, class_weight='balanced', random_state=1234):
+        self.C = C
+        self.gamma = gamma
+        self.method = method
+        self.n_components = n_components
+        self.class_weight = class_weight
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        from sklearn.kernel_approximation import Nystroem, RBFSampler
+        from sklearn.svm import LinearSVC
+
+        gamma = self.gamma
+
+        if gamma == 'scale':
+            variance = (X.multiply(X).mean() - X.mean()**2) if sparse.issparse(X) else np.asarray(X).var()
+            gamma = 1.0 / (X.shape[1] * variance) if variance > 0 else 1.0
+
+        if self.method == 'nystroem':
+            self.features_ = Nystroem(kernel = 'rbf', gamma = gamma, n_components = min(self.n_components, X.shape[0]),
+                                      random_state = self.random_state)
+        elif self.method == 'rff':
+            self.features_ = RBFSampler(gamma = gamma, n_components = self.n_components, random_state = self.random_state)
+        else:
+            raise ValueError(f"Unknown kernel approximation: {self.method}")
+
+        self.linear_ = LinearSVC(C = self.C, class_weight = self.class_weight, dual = True)
+        self.linear_.fit(self.features_.fit_transform(X), y)
+        self.classes_ = self.linear_.classes_
+
+        return self
+
+    def decision_function(self, X):
+        return self.linear_.decision_function(self.features_.transform(X))
+
+    def predict(self, X):
+        return self.linear_.predict(self.features_.transform(X))
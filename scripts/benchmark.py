@@ -0,0 +1,148 @@
+'''This script benchmarks the candidate models of modeling.py on the train data scaled to several sizes.
+For each model and size it measures the fit time of the whole pipeline (preprocessor and model), the batch
+prediction throughput on the scaled rows, the single-row prediction latency and the peak memory of the fit,
+and saves them in a csv file. The rows are repeated with noise on the numerical features of the copies, so
+the larger sizes are not just exact duplicates.
+
+Each model and size runs in its own process, so the peak memory of one fit is not mixed with the others.
+
+Usage: benchmark.py [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>] [--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>] [--SCALES=<SCALES>] [--MODELS=<MODELS>] [--SVM_MODE=<SVM_MODE>] [--JITTER=<JITTER>] [--LATENCY_ROWS=<LATENCY_ROWS>] [--MODEL_TIMEOUT=<MODEL_TIMEOUT>] [--BENCHMARK_PATH=<BENCHMARK_PATH>]
+
+Options:
+--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>  Path (including filename) to gather the csv (or parquet, feather, arrow) file. [default: data/pokemon_smogon_competitive_train.csv]
+--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>  String of categorical features separated by commas [default: Type1,Type2,Mega,Has_ST]
+--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>  String of numerical features separated by commas [default: HP,Attack,Defense,Special_attack,Special_defense,Speed]
+--SCALES=<SCALES>  Number of times the train rows are repeated, separated by commas. [default: 1,10,100,1000]
+--MODELS=<MODELS>  Models to benchmark separated by commas, all for every model of modeling.py. [default: all]
+--SVM_MODE=<SVM_MODE>  exact, nystroem or rff, how the RBF SVM models are fitted (see modeling.py). [default: exact]
+--JITTER=<JITTER>  Relative standard deviation of the noise multiplied into the numerical features of the repeated rows. [default: 0.2]
+--LATENCY_ROWS=<LATENCY_ROWS>  Number of single-row predictions used to measure the latency. [default: 100]
+--MODEL_TIMEOUT=<MODEL_TIMEOUT>  Seconds each model may take at each size, the runs that take longer are stopped and marked as timed out. 0 for no limit. [default: 600]
+--BENCHMARK_PATH=<BENCHMARK_PATH>  Path to output the benchmark table. [default: results/benchmark.csv]
+'''
+
+from docopt import docopt
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from modeling import MODEL_NAMES, build_pipeline, make_model, preprocessing
+from parallel import run_with_timeouts
+from profiling import peak_memory, reset_peak_memory
+from schema import read_wrangled
+
+METRICS = ['Fit time in seconds', 'Rows per second', 'Median latency in ms', 'P99 latency in ms', 'Peak memory in MB']
+
+def main(data_file_path, cat_features, num_features, scales, models, svm_mode, jitter, latency_rows, model_timeout,
+         benchmark_path):
+    assert os.path.isfile(data_file_path), "TRAIN_FILE_PATH does not exist"
+
+    categorical_features = cat_features.split(",")
+    numeric_features = num_features.split(",")
+    all_features = categorical_features + numeric_features
+    model_names = MODEL_NAMES if models == 'all' else models.split(",")
+    timeout = float(model_timeout) if float(model_timeout) > 0 else None
+
+    data = read_wrangled(data_file_path, usecols = all_features + ['Tier_2'])
+    results = []
+
+    for scale in [int(scale) for scale in scales.split(",")]:
+        X, y = scale_data(data[all_features], data['Tier_2'], scale, numeric_features, float(jitter))
+        print(f"Benchmarking {len(model_names)} models on {len(X)} rows ({scale}x)... \n", end='')
+
+        tasks = [(model_name, svm_mode, categorical_features, numeric_features, X, y, int(latency_rows))
+                 for model_name in model_names]
+        outputs = run_with_timeouts(benchmark_model, tasks, 1, timeout, None)
+
+        for model_name, (output, elapsed_time, _) in zip(model_names, outputs):
+            status = 'ok' if output is not None else 'timed out'
+            metrics = output if output is not None else {metric: np.nan for metric in METRICS}
+            results.append({'Model': model_name, 'Scale': scale, 'Rows': len(X), **metrics, 'Status': status})
+            print(f"{model_name}: {status} ({elapsed_time:.1f} s)")
+
+    results = pd.DataFrame(results)
+
+    if os.path.dirname(benchmark_path):
+        os.makedirs(os.path.dirname(benchmark_path), exist_ok = True)
+    results.to_csv(benchmark_path, index = False)
+    print(results)
+
+def scale_data(X, y, scale, numeric_features, jitter=0.2, random_state=1234):
+    """
+    Repeats the rows of a dataset, multiplying the numerical features of the copies by random noise
+
+    Parameters:
+    X -- (dataframe) explanatory variables
+    y -- (series) response variable
+    scale -- (int) number of times the rows are repeated
+    numeric_features -- (list) numerical features that get the noise
+    jitter -- (float) relative standard deviation of the noise
+    random_state -- (int) seed of the noise
+
+    Returns:
+    X -- (dataframe) scaled explanatory variables, the original rows first
+    y -- (series) scaled response variable
+    """
+    if scale <= 1:
+        return X, y
+
+    n_rows = len(X)
+    X = pd.concat([X] * scale, ignore_index = True).astype({feature: 'float64' for feature in numeric_features})
+    y = pd.concat([y] * scale, ignore_index = True)
+
+    # The original rows are kept as they are, only the copies get noise
+    noise = 1 + jitter * np.random.RandomState(random_state).randn(len(X) - n_rows, len(numeric_features))
+    X.loc[n_rows:, numeric_features] = X.loc[n_rows:, numeric_features].to_numpy() * noise
+
+    return X, y
+
+def benchmark_model(model_name, svm_mode, categorical_features, numeric_features, X, y, latency_rows):
+    """
+    Fits a model pipeline and measures its fit time, batch throughput, single-row latency and peak memory.
+    It runs in a fresh process, so the peak memory is the growth of the peak of the process during the fit
+
+    Parameters:
+    model_name -- (string) name of the model, one of MODEL_NAMES
+    svm_mode -- (string) 'exact', 'nystroem' or 'rff', how the RBF SVM models are fitted
+    categorical_features -- (list) list of categorical features
+    numeric_features -- (list) list of numerical features
+    X -- (dataframe) explanatory variables
+    y -- (series) response variable
+    latency_rows -- (int) number of single-row predictions
+
+    Returns:
+    metrics -- (dictionary) fit time, rows per second, median and 99th percentile latency, peak memory
+    """
+    clf = build_pipeline(preprocessing(categorical_features, numeric_features), make_model(model_name, svm_mode))
+    reset_peak_memory()
+    memory_before = peak_memory()
+
+    start = time.perf_counter()
+    clf.fit(X, y)
+    fit_time = time.perf_counter() - start
+
+    memory_peak = peak_memory() - memory_before
+
+    start = time.perf_counter()
+    clf.predict(X)
+    predict_time = time.perf_counter() - start
+
+    latencies = []
+
+    for i in np.random.RandomState(1234).randint(len(X), size = latency_rows):
+        row = X.iloc[[i]]
+        start = time.perf_counter()
+        clf.predict(row)
+        latencies.append(time.perf_counter() - start)
+
+    return dict(zip(METRICS, [round(fit_time, 4), round(len(X) / predict_time, 1),
+                              round(1000 * np.median(latencies), 3), round(1000 * np.percentile(latencies, 99), 3),
+                              round(memory_peak, 1)]))
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--TRAIN_FILE_PATH"], opt["--CATEGORICAL_FEATURES"], opt["--NUMERICAL_FEATURES"], opt["--SCALES"],
+         opt["--MODELS"], opt["--SVM_MODE"], opt["--JITTER"], opt["--LATENCY_ROWS"], opt["--MODEL_TIMEOUT"],
+         opt["--BENCHMARK_PATH"])
@@ -0,0 +1,266 @@
+'''This script compiles the dumped final model (a Pipeline with the one hot encoding ColumnTransformer and a
+OneVsOneClassifier of logistic regressions) into a NumPy-only predictor. The compiled predictor holds the category lookup
+tables, the scaler mean and scale vectors and the stacked pairwise coefficients, so it does not need sklearn to predict.
+The script checks that the compiled predictor gives the same predictions as the pipeline and reports both timings.
+
+Usage: compiled_model.py [--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>] [--COMPILED_MODEL_PATH=<COMPILED_MODEL_PATH>] [--CHECK_FILE_PATH=<CHECK_FILE_PATH>] [--REPEATS=<REPEATS>]
+
+Options:
+--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>  Path of the dumped final model. [default: results/models/final_model.pic]
+--COMPILED_MODEL_PATH=<COMPILED_MODEL_PATH>  Path to output the compiled model. [default: results/models/final_model_compiled.pic]
+--CHECK_FILE_PATH=<CHECK_FILE_PATH>  Path of a wrangled csv used to check the predictions and time both models. [default: data/pokemon_smogon_competitive_test.csv]
+--REPEATS=<REPEATS>  Number of repetitions of each timing. [default: 100]
+'''
+
+from docopt import docopt
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import read_wrangled
+
+def main(model_dump_path, compiled_model_path, check_file_path, repeats):
+    assert os.path.isfile(model_dump_path), "MODEL_DUMP_PATH does not exist"
+    assert os.path.isfile(check_file_path), "CHECK_FILE_PATH does not exist"
+
+    print("Compiling the final model... \n", end='')
+    with open(model_dump_path, 'rb') as fp:
+        final_model = pickle.load(fp)
+
+    compiled_model = compile_pipeline(final_model)
+
+    print("Checking the predictions... \n", end='')
+    X = read_wrangled(check_file_path, usecols = compiled_model.features)
+
+    n_different = int((final_model.predict(X) != compiled_model.predict(X)).sum())
+    assert n_different == 0, f"The compiled model differs from the pipeline in {n_different} rows"
+    print(f"Same predictions in the {len(X)} rows")
+
+    timings = pd.DataFrame({
+        'Pipeline': [time_call(final_model.predict, X, int(repeats)),
+                     time_call(final_model.predict, X.iloc[:1], int(repeats))],
+        'Compiled': [time_call(compiled_model.predict, X, int(repeats)),
+                     time_call(compiled_model.predict_records, X.iloc[:1].to_dict('records'), int(repeats))]
+    }, index = [f'Batch of {len(X)} rows (ms)', 'Single row (ms)'])
+    timings['Speedup'] = timings['Pipeline'] / timings['Compiled']
+    print(timings.round(3))
+
+    print("Dumping the compiled model... \n", end='')
+    with open(compiled_model_path, 'wb') as fp:
+        pickle.dump(compiled_model, fp)
+
+class CompiledOVOLogistic:
+    """
+    NumPy-only version of the final pipeline: imputation and one hot encoding through lookup tables,
+    standard scaling and the one-vs-one vote of the pairwise logistic regressions.
+    """
+
+    def __init__(self, categorical_features, numeric_features, fill_value, lookups, n_columns,
+                 mean, scale, coef, intercept, classes):
+        self.categorical_features = list(categorical_features)
+        self.numeric_features = list(numeric_features)
+        self.features = self.categorical_features + self.numeric_features
+        self.fill_value = fill_value
+        self.lookups = lookups
+        self.n_columns = n_columns
+        self.mean = mean
+        self.scale = scale
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+
+        # Pair k votes for class pair_i[k] when its score is negative, for pair_j[k] otherwise
+
+        n_classes = len(classes)
+        pairs = [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+        self.pair_i = np.eye(n_classes)[[i for i, _ in pairs]]
+        self.pair_j = np.eye(n_classes)[[j for _, j in pairs]]
+
+    def transform(self, X):
+        """
+        Builds the design matrix of a dataframe
+
+        Parameters:
+        X -- (dataframe) dataframe with the features
+
+        Returns:
+        Xt -- (array) dense design matrix
+        """
+        Xt = np.zeros((len(X), self.n_columns))
+        rows = np.arange(len(X))
+
+        for feature, lookup in zip(self.categorical_features, self.lookups):
+            values = X[feature].to_numpy(dtype = object)
+            values[pd.isnull(values)] = self.fill_value
+            columns = np.fromiter((lookup.get(value, -1) for value in values), dtype = int, count = len(values))
+            known = columns >= 0
+            Xt[rows[known], columns[known]] = 1
+
+        numeric = np.column_stack([X[feature].to_numpy(dtype = float) for feature in self.numeric_features])
+        Xt[:, -len(self.numeric_features):] = (numeric - self.mean) / self.scale
+
+        return Xt
+
+    def transform_records(self, records):
+        """
+        Builds the design matrix of a list of rows without going through pandas
+
+        Parameters:
+        records -- (list) list of dictionaries with the features
+
+        Returns:
+        Xt -- (array) dense design matrix
+        """
+        Xt = np.zeros((len(records), self.n_columns))
+
+        for r, record in enumerate(records):
+            for feature, lookup in zip(self.categorical_features, self.lookups):
+                value = record.get(feature)
+                column = lookup.get(self.fill_value if value is None or value != value else value)
+                if column is not None:
+                    Xt[r, column] = 1
+
+        numeric = np.array([[record[feature] for feature in self.numeric_features] for record in records], dtype = float)
+        Xt[:, -len(self.numeric_features):] = (numeric - self.mean) / self.scale
+
+        return Xt
+
+    def decision_function(self, Xt):
+        """
+        One-vs-one votes plus the transformed confidences, as OneVsOneClassifier computes them
+
+        Parameters:
+        Xt -- (array) design matrix
+
+        Returns:
+        Y -- (array) decision values of each class
+        """
+        scores = Xt @ self.coef.T + self.intercept
+        positive = (scores > 0).astype(float)
+
+        votes = (1 - positive) @ self.pair_i + positive @ self.pair_j
+        confidences = scores @ (self.pair_j - self.pair_i)
+
+        return votes + confidences / (3 * (np.abs(confidences) + 1))
+
+    def predict_matrix(self, Xt):
+        """
+        Predicts the tier of a design matrix
+
+        Parameters:
+        Xt -- (array) design matrix
+
+        Returns:
+        predictions -- (array) predicted tiers
+        """
+        Y = self.decision_function(Xt)
+
+        if len(self.classes) == 2:
+            return self.classes[(Y[:, 1] > 0).astype(int)]
+
+        return self.classes[Y.argmax(axis = 1)]
+
+    def predict(self, X):
+        """
+        Predicts the tier of a dataframe
+
+        Parameters:
+        X -- (dataframe) dataframe with the features
+
+        Returns:
+        predictions -- (array) predicted tiers
+        """
+        return self.predict_matrix(self.transform(X))
+
+    def predict_records(self, records):
+        """
+        Predicts the tier of a list of rows (e.g. a single request)
+
+        Parameters:
+        records -- (list) list of dictionaries with the features
+
+        Returns:
+        predictions -- (array) predicted tiers
+        """
+        return self.predict_matrix(self.transform_records(records))
+
+def compile_pipeline(pipeline):
+    """
+    Compiles a fitted final pipeline into a CompiledOVOLogistic
+
+    Parameters:
+    pipeline -- (sklearn.pipeline.Pipeline) fitted pipeline with a 'preprocessor' ColumnTransformer
+    and a OneVsOneClassifier of LogisticRegression as 'classifier'
+
+    Returns:
+    compiled_model -- (CompiledOVOLogistic) compiled predictor
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.multiclass import OneVsOneClassifier
+
+    preprocessor = pipeline.named_steps['preprocessor']
+    classifier = pipeline.named_steps['classifier']
+
+    if not isinstance(classifier, OneVsOneClassifier) or \
+       not all(isinstance(estimator, LogisticRegression) for estimator in classifier.estimators_):
+        raise ValueError("Only a OneVsOneClassifier of LogisticRegression can be compiled")
+
+    transformers = {name: (transformer, features) for name, transformer, features in preprocessor.transformers_}
+
+    if [name for name, _, _ in preprocessor.transformers_ if name != 'remainder'] != ['cat', 'num'] or \
+       transformers.get('remainder', ('drop',))[0] != 'drop':
+        raise ValueError("The preprocessor must only have the 'cat' and 'num' transformers of modeling.preprocessing")
+
+    categorical, categorical_features = transformers['cat']
+    numerical, numeric_features = transformers['num']
+    imputer = categorical.named_steps['imputer']
+    onehot = categorical.named_steps['onehot']
+    scaler = numerical.named_steps['standard']
+
+    # Each category points to its column of the design matrix
+
+    lookups = []
+    offset = 0
+
+    for categories in onehot.categories_:
+        lookups.append({category: offset + k for k, category in enumerate(categories)})
+        offset += len(categories)
+
+    n_features = len(numeric_features)
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+
+    return CompiledOVOLogistic(categorical_features, numeric_features, imputer.fill_value, lookups,
+                               offset + n_features, np.asarray(mean, dtype = float), np.asarray(scale, dtype = float),
+                               np.vstack([estimator.coef_ for estimator in classifier.estimators_]),
+                               np.hstack([estimator.intercept_ for estimator in classifier.estimators_]),
+                               np.asarray(classifier.classes_))
+
+def time_call(func, X, repeats):
+    """
+    Measures the mean time of a call in milliseconds
+
+    Parameters:
+    func -- (callable) function to time
+    X -- (dataframe or list) argument of the function
+    repeats -- (int) number of calls
+
+    Returns:
+    milliseconds -- (float) mean time of a call
+    """
+    t = time.perf_counter()
+
+    for _ in range(repeats):
+        func(X)
+
+    return (time.perf_counter() - t) / repeats * 1000
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    # Running main from the imported module, so the compiled model is pickled as
+    # compiled_model.CompiledOVOLogistic and not as __main__.CompiledOVOLogistic
+    import compiled_model
+    compiled_model.main(opt["--MODEL_DUMP_PATH"], opt["--COMPILED_MODEL_PATH"], opt["--CHECK_FILE_PATH"], opt["--REPEATS"])
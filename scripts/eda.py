@@ -4,11 +4,15 @@
 '''This script will generate exploratory data analysis visualizations. It takes as arguments the file were the root 
 file is, the path where the visualizations will be saved.
 
-Usage: eda.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--EDA_FILE_PATH=<EDA_FILE_PATH>]
+Usage: eda.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--EDA_FILE_PATH=<EDA_FILE_PATH>] [--PROFILE_PATH=<PROFILE_PATH>] [--PROFILE_STAGE=<PROFILE_STAGE>] [--USE_CACHE=<USE_CACHE>] [--CACHE_DIR=<CACHE_DIR>]
 
 Options:
---DATA_FILE_PATH=<DATA_FILE_PATH>  Path (including filename) to gather the csv file. [default: data/pokemon_smogon_competitive_train.csv]
+--DATA_FILE_PATH=<DATA_FILE_PATH>  Path (including filename) to gather the csv (or parquet, feather, arrow) file. [default: data/pokemon_smogon_competitive_train.csv]
 --EDA_FILE_PATH=<EDA_FILE_PATH>  Path to output EDA files. [default: results/figures/]
+--PROFILE_PATH=<PROFILE_PATH>  Path of a JSON lines file where the wall time, CPU time and peak memory of each stage (load, correlation, bars) are appended (see profiling.py). None to disable the profiling. [default: None]
+--PROFILE_STAGE=<PROFILE_STAGE>  Name of a stage run under cProfile, its stats are dumped next to PROFILE_PATH. None for no stage. [default: None]
+--USE_CACHE=<USE_CACHE>  True to restore the outputs from the stage cache when the inputs and options did not change, False otherwise. [default: False]
+--CACHE_DIR=<CACHE_DIR>  Folder of the stage cache. [default: results/.stage_cache/]
 '''
 
 from docopt import docopt
@@ -17,20 +21,48 @@ import altair as alt
 import plotly.graph_objects as go
 from selenium import webdriver
 import os
-#browser = webdriver.Chrome('C:\webdrivers\chromedriver.exe')
-
+from profiling import configure_profile, profile_stage
+from schema import read_wrangled, STATS
+from stage_cache import run_cached
 
-opt = docopt(__doc__)
+EDA_COLUMNS = ['Number', 'Total'] + STATS + ['Generation', 'Legendary', 'Mega', 'Tier_2']
+#browser = webdriver.Chrome('C:\webdrivers\chromedriver.exe')
 
 def main(data_file_path, eda_file_path):
     assert os.path.isfile(data_file_path), "File does not exist"
     assert os.path.isdir(eda_file_path), "EDA_FILE_PATH does not exist, please create a 'figures' folder in results"
 
-    data = pd.read_csv(data_file_path)
-    data = data.loc[:, ~data.columns.str.contains('^Unnamed')]
+    with profile_stage('load'):
+        data = read_wrangled(data_file_path, usecols = EDA_COLUMNS)
     
-    make_correlation(data, eda_file_path)
-    make_bars(data, eda_file_path)
+    run_eda(data, eda_file_path)
+
+def run_eda(data, eda_file_path):
+    """
+    Saves the EDA plots of a wrangled dataframe already in memory.
+
+    Parameters:
+    data -- (dataframe) The training data
+    eda_file_path -- (str) The path where the plots are saved
+    """
+    data = data[EDA_COLUMNS]
+
+    with profile_stage('correlation'):
+        make_correlation(data, eda_file_path)
+    with profile_stage('bars'):
+        make_bars(data, eda_file_path)
+
+def eda_outputs(eda_file_path):
+    """
+    Lists the plots saved by the script.
+
+    Parameters:
+    eda_file_path -- (str) The path where the plots are saved
+
+    Returns:
+    output_paths -- (list) Paths of the plots
+    """
+    return ["{}corrplot.png".format(eda_file_path)] + ['{}{}.png'.format(eda_file_path, stat) for stat in STATS]
 
 def make_correlation(data, eda_file_path):
     """
@@ -114,4 +146,10 @@ def make_bars(data, eda_file_path):
         print(f"{numerical_features[i]}.png saved in {eda_file_path}")
 
 if __name__ == "__main__":
-     main(opt["--DATA_FILE_PATH"], opt["--EDA_FILE_PATH"])
\ No newline at end of file
+     opt = docopt(__doc__)
+     configure_profile(opt["--PROFILE_PATH"], opt["--PROFILE_STAGE"], 'eda')
+     
+     with profile_stage('total'):
+         run_cached('eda', [opt["--DATA_FILE_PATH"]], eda_outputs(opt["--EDA_FILE_PATH"]), opt,
+                    lambda: main(opt["--DATA_FILE_PATH"], opt["--EDA_FILE_PATH"]),
+                    opt["--CACHE_DIR"], opt["--USE_CACHE"])
\ No newline at end of file
@@ -0,0 +1,181 @@
+'''Disk-backed store for the transformed design matrices and the fitted preprocessor.
+
+Each entry is a folder named after a hash of the input files (or dataframes) and the feature lists.
+Dense matrices are saved as .npy files (loaded memory-mapped) and sparse matrices as .npz files.
+'''
+
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def file_digest(file_path, hasher=None):
+    """
+    Hashes the content of a file
+
+    Parameters:
+    file_path -- (string) path of the file
+    hasher -- (hashlib object) hasher to update, a new sha256 is used if None
+
+    Returns:
+    hasher -- (hashlib object) updated hasher
+    """
+    hasher = hasher or hashlib.sha256()
+
+    with open(file_path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            hasher.update(block)
+
+    return hasher
+
+def frame_digest(data, hasher=None):
+    """
+    Hashes the content of a dataframe (columns, dtypes, index and values)
+
+    Parameters:
+    data -- (dataframe) dataframe to hash
+    hasher -- (hashlib object) hasher to update, a new sha256 is used if None
+
+    Returns:
+    hasher -- (hashlib object) updated hasher
+    """
+    hasher = hasher or hashlib.sha256()
+
+    hasher.update(repr([(str(column), str(dtype)) for column, dtype in data.dtypes.items()]).encode())
+    hasher.update(pd.util.hash_pandas_object(data, index = True).to_numpy().tobytes())
+
+    return hasher
+
+def code_digest(*functions):
+    """
+    Hashes the source code of some functions, e.g. the ones that build the matrices
+
+    Parameters:
+    functions -- (callable) functions to hash
+
+    Returns:
+    digest -- (string) hexadecimal hash
+    """
+    hasher = hashlib.sha256()
+
+    for function in functions:
+        hasher.update(inspect.getsource(function).encode())
+
+    return hasher.hexdigest()
+
+def feature_key(sources, categorical_features, numeric_features, extra=''):
+    """
+    Builds the key of a feature store entry
+
+    Parameters:
+    sources -- (list) input files or dataframes the matrices are built from, None entries are skipped
+    categorical_features -- (list) list of categorical features
+    numeric_features -- (list) list of numerical features
+    extra -- (string) anything else the matrices depend on (e.g. the split, the preprocessing code and the sklearn version)
+
+    Returns:
+    key -- (string) hexadecimal hash
+    """
+    hasher = hashlib.sha256()
+
+    for source in sources:
+        if isinstance(source, pd.DataFrame):
+            frame_digest(source, hasher)
+        elif source is not None:
+            file_digest(source, hasher)
+
+    hasher.update(repr((list(categorical_features), list(numeric_features), extra)).encode())
+
+    return hasher.hexdigest()
+
+def save_entry(store_path, key, write_files, replace=False):
+    """
+    Saves an entry of a store (the feature store or the stage cache) in a folder named after its key.
+    The files are written in a temporary folder that is renamed at the end, so a half written entry is never loaded
+
+    Parameters:
+    store_path -- (string) folder of the store
+    key -- (string) key of the entry
+    write_files -- (callable) writes the files of the entry in the folder it is called with
+    replace -- (bool) True to replace an existing entry, False to keep it
+    """
+    os.makedirs(store_path, exist_ok = True)
+    tmp_path = tempfile.mkdtemp(dir = store_path)
+
+    try:
+        write_files(tmp_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors = True)
+        raise
+
+    entry_path = os.path.join(store_path, key)
+
+    if replace:
+        shutil.rmtree(entry_path, ignore_errors = True)
+
+    try:
+        os.rename(tmp_path, entry_path)
+    except OSError:
+        # Another run stored the same entry in the meantime
+        shutil.rmtree(tmp_path, ignore_errors = True)
+
+def save_features(store_path, key, matrices, preprocessor):
+    """
+    Saves the matrices and the fitted preprocessor under a key
+
+    Parameters:
+    store_path -- (string) folder of the feature store
+    key -- (string) key of the entry
+    matrices -- (dictionary) dictionary of design matrices
+    preprocessor -- (sklearn.compose.ColumnTransformer) fitted preprocessor
+    """
+    def write_files(entry_path):
+        for name, matrix in matrices.items():
+            if sparse.issparse(matrix):
+                sparse.save_npz(os.path.join(entry_path, f'{name}.npz'), matrix.tocsr())
+            else:
+                np.save(os.path.join(entry_path, f'{name}.npy'), np.asarray(matrix))
+
+        with open(os.path.join(entry_path, 'preprocessor.pic'), 'wb') as fp:
+            pickle.dump(preprocessor, fp)
+
+    save_entry(store_path, key, write_files)
+
+def load_features(store_path, key):
+    """
+    Loads the matrices and the fitted preprocessor of a key
+
+    Parameters:
+    store_path -- (string) folder of the feature store
+    key -- (string) key of the entry
+
+    Returns:
+    matrices -- (dictionary) dictionary of design matrices, None if the key is not stored
+    preprocessor -- (sklearn.compose.ColumnTransformer) fitted preprocessor, None if the key is not stored
+    """
+    entry_path = os.path.join(store_path, key)
+
+    if not os.path.isdir(entry_path):
+        return None, None
+
+    matrices = {}
+
+    for file_name in sorted(os.listdir(entry_path)):
+        name, extension = os.path.splitext(file_name)
+
+        if extension == '.npy':
+            matrices[name] = np.load(os.path.join(entry_path, file_name), mmap_mode = 'r')
+        elif extension == '.npz':
+            matrices[name] = sparse.load_npz(os.path.join(entry_path, file_name))
+
+    with open(os.path.join(entry_path, 'preprocessor.pic'), 'rb') as fp:
+        preprocessor = pickle.load(fp)
+
+    return matrices, preprocessor
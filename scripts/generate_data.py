@@ -0,0 +1,131 @@
+'''This script generates a synthetic Pokémon dataset in the raw schema, to stress test wrangling.py and modeling.py
+with many more rows than the real data. The generator is learned from a raw csv and is conditional on the tier:
+    the tier of each row is drawn with its frequency in the data,
+    the discrete columns (Number, types, Generation, Legendary and Mega) are drawn together from a real row of the tier,
+    the stats are drawn from a multivariate normal of their logarithms fitted on the tier, and Total is their sum.
+The rows are sampled and written by chunks, so any number of rows can be generated with a fixed amount of memory.
+
+Usage: generate_data.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--OUTPUT_PATH=<OUTPUT_PATH>] [--ROWS=<ROWS>] [--CHUNK_SIZE=<CHUNK_SIZE>] [--UNLABELED=<UNLABELED>] [--SEED=<SEED>]
+
+Options:
+--DATA_FILE_PATH=<DATA_FILE_PATH>  Path (including filename) of the raw csv the generator is learned from. [default: data/pokemon_smogon_competitive.csv]
+--OUTPUT_PATH=<OUTPUT_PATH>  Path (including filename) to print the synthetic raw csv. [default: data/synthetic/pokemon_synthetic.csv]
+--ROWS=<ROWS>  Number of rows to generate. [default: 100000]
+--CHUNK_SIZE=<CHUNK_SIZE>  Number of rows sampled and written at a time. [default: 100000]
+--UNLABELED=<UNLABELED>  True to write NONE as the tier of every row, like the new generation dataset (wrangling.py --NEW_GEN=True), False otherwise. [default: False]
+--SEED=<SEED>  Seed of the random generator. [default: 1234]
+'''
+
+from docopt import docopt
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import read_raw
+
+RAW_STATS = ['HP', 'Attack', 'Defense', 'Sp..Atk', 'Sp..Def', 'Speed']
+DISCRETE_COLUMNS = ['X.', 'Type.1', 'Type.2', 'Generation', 'Legendary', 'Mega']
+
+# Weight (in rows) of the covariance of all the tiers in the covariance of each tier, so the
+# tiers with a handful of rows still get a valid covariance
+PRIOR_ROWS = 10
+
+def main(data_file_path, output_path, rows, chunk_size, unlabeled, seed):
+    assert os.path.isfile(data_file_path), "DATA_FILE_PATH does not exist"
+
+    start = time.time()
+    generator = fit_generator(read_raw(data_file_path))
+    rng = np.random.default_rng(int(seed))
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok = True)
+
+    for chunk_start in range(0, int(rows), int(chunk_size)):
+        n_rows = min(int(chunk_size), int(rows) - chunk_start)
+        chunk = sample_rows(generator, n_rows, rng, chunk_start)
+
+        if unlabeled == 'True':
+            chunk['Tier'] = 'NONE'
+
+        chunk.to_csv(output_path, mode = 'w' if chunk_start == 0 else 'a', header = chunk_start == 0, index = False)
+
+    print(f"Generated {rows} rows in {time.time() - start:.1f} seconds")
+
+def fit_generator(data):
+    """
+    Learns the distribution of each tier: its frequency, its real rows (for the discrete columns)
+    and the mean and covariance of the logarithm of its stats
+
+    Parameters:
+    data -- (dataframe) raw data
+
+    Returns:
+    generator -- (dictionary) tiers, their probabilities, and the discrete columns, stats means and
+    Cholesky factors of the stats covariances of each tier
+    """
+    data = data.dropna(subset = ['Tier'])
+    log_stats = np.log(data[RAW_STATS].to_numpy(dtype = 'float64'))
+    pooled_cov = np.cov(log_stats, rowvar = False)
+
+    tiers = data['Tier'].astype(str).to_numpy()
+    tier_names, tier_counts = np.unique(tiers, return_counts = True)
+    generator = {'tiers': tier_names, 'probabilities': tier_counts / tier_counts.sum(), 'columns': {}}
+
+    for tier, count in zip(tier_names, tier_counts):
+        in_tier = tiers == tier
+        tier_cov = np.cov(log_stats[in_tier], rowvar = False) if count > 1 else np.zeros_like(pooled_cov)
+        cov = ((count - 1) * tier_cov + PRIOR_ROWS * pooled_cov) / (count - 1 + PRIOR_ROWS)
+
+        generator['columns'][tier] = {'discrete': data.loc[in_tier, DISCRETE_COLUMNS].reset_index(drop = True),
+                                      'mean': log_stats[in_tier].mean(axis = 0),
+                                      'cholesky': np.linalg.cholesky(cov)}
+
+    return generator
+
+def sample_rows(generator, n_rows, rng, start=0):
+    """
+    Samples rows in the raw schema, all the rows of a tier at once
+
+    Parameters:
+    generator -- (dictionary) output of fit_generator
+    n_rows -- (int) number of rows
+    rng -- (numpy.random.Generator) random generator
+    start -- (int) number of rows already generated, used to give each row a unique name
+
+    Returns:
+    data -- (dataframe) synthetic rows in the raw schema
+    """
+    tier_counts = rng.multinomial(n_rows, generator['probabilities'])
+    chunks = []
+
+    for tier, count in zip(generator['tiers'], tier_counts):
+        if count == 0:
+            continue
+
+        columns = generator['columns'][tier]
+        discrete = columns['discrete']
+        chunk = discrete.iloc[rng.integers(len(discrete), size = count)].reset_index(drop = True)
+
+        log_stats = columns['mean'] + rng.standard_normal((count, len(RAW_STATS))) @ columns['cholesky'].T
+        stats = pd.DataFrame(np.clip(np.rint(np.exp(log_stats)), 1, 255).astype('uint8'), columns = RAW_STATS)
+
+        chunk = pd.concat([chunk, stats], axis = 1)
+        chunk['Total'] = stats.sum(axis = 1).astype('int16')
+        chunk['Tier'] = tier
+        chunks.append(chunk)
+
+    # Shuffling the rows so the tiers are mixed inside the chunk
+    data = pd.concat(chunks, ignore_index = True)
+    data = data.iloc[rng.permutation(len(data))].reset_index(drop = True)
+    data['Name'] = 'Synthetic ' + pd.Series(np.arange(start, start + len(data))).astype(str)
+    data['Legendary'] = np.where(data['Legendary'], 'TRUE', 'FALSE')
+    data['Mega'] = np.where(data['Mega'], 'TRUE', 'FALSE')
+
+    return data[['X.', 'Name', 'Type.1', 'Type.2', 'Total'] + RAW_STATS + ['Generation', 'Legendary', 'Mega', 'Tier']]
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--DATA_FILE_PATH"], opt["--OUTPUT_PATH"], opt["--ROWS"], opt["--CHUNK_SIZE"], opt["--UNLABELED"],
+         opt["--SEED"])
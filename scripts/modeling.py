@@ -3,12 +3,12 @@
 
 '''This script evaluates a set of models a prints the results so that the user chooses the model.
 
-Usage: modeling.py [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--TEST_FILE_PATH=<TEST_FILE_PATH>] [--NEW_GEN_PATH=<NEW_GEN_PATH>] [--RESULTS_FILE_PATH=<RESULTS_FILE_PATH>] [--IMPORTANCES_FILE_PATH=<IMPORTANCES_FILE_PATH>] [--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>] [--IMPORTANCE_PLOT_PATH=<IMPORTANCE_PLOT_PATH>] [--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>] [--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>] [--RESULTS_FINAL_PATH=<RESULTS_FINAL_PATH>] [--FINAL_PREDICTION_PATH=<FINAL_PREDICTION_PATH>] [--NEWGEN_PREDICTION_PATH=<NEWGEN_PREDICTION>]
+Usage: modeling.py [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--TEST_FILE_PATH=<TEST_FILE_PATH>] [--NEW_GEN_PATH=<NEW_GEN_PATH>] [--RESULTS_FILE_PATH=<RESULTS_FILE_PATH>] [--IMPORTANCES_FILE_PATH=<IMPORTANCES_FILE_PATH>] [--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>] [--IMPORTANCE_PLOT_PATH=<IMPORTANCE_PLOT_PATH>] [--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>] [--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>] [--RESULTS_FINAL_PATH=<RESULTS_FINAL_PATH>] [--FINAL_PREDICTION_PATH=<FINAL_PREDICTION_PATH>] [--NEWGEN_PREDICTION_PATH=<NEWGEN_PREDICTION>] [--N_JOBS=<N_JOBS>] [--USE_FEATURE_STORE=<USE_FEATURE_STORE>] [--FEATURE_STORE_PATH=<FEATURE_STORE_PATH>] [--PREDICT_ONLY=<PREDICT_ONLY>] [--CHUNK_SIZE=<CHUNK_SIZE>] [--APPEND=<APPEND>] [--SPLIT=<SPLIT>] [--CV_FOLDS=<CV_FOLDS>] [--CV_REPEATS=<CV_REPEATS>] [--CV_RESULTS_PATH=<CV_RESULTS_PATH>] [--CV_FOLD_RESULTS_PATH=<CV_FOLD_RESULTS_PATH>] [--TUNE=<TUNE>] [--TUNE_BUDGET=<TUNE_BUDGET>] [--TUNE_CONFIGS=<TUNE_CONFIGS>] [--MODEL_TIMEOUT=<MODEL_TIMEOUT>] [--TIME_BUDGET=<TIME_BUDGET>] [--SVM_MODE=<SVM_MODE>] [--PROFILE_PATH=<PROFILE_PATH>] [--PROFILE_STAGE=<PROFILE_STAGE>] [--USE_CACHE=<USE_CACHE>] [--CACHE_DIR=<CACHE_DIR>]
 
 Options:
---TRAIN_FILE_PATH=<TRAIN_FILE_PATH>  Path (including filename) to gather the csv file. [default: data/pokemon_smogon_competitive_train.csv]
---TEST_FILE_PATH=<TEST_FILE_PATH>  Path (including filename) to gather the test csv file. [default: data/pokemon_smogon_competitive_test.csv]
---NEW_GEN_PATH=<NEW_GEN_PATH>  Path to the new generation csv. [default: data/new_gen_wrangled.csv]
+--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>  Path (including filename) to gather the csv (or parquet, feather, arrow) file. [default: data/pokemon_smogon_competitive_train.csv]
+--TEST_FILE_PATH=<TEST_FILE_PATH>  Path (including filename) to gather the test csv (or parquet, feather, arrow) file. [default: data/pokemon_smogon_competitive_test.csv]
+--NEW_GEN_PATH=<NEW_GEN_PATH>  Path to the new generation csv (or parquet, feather, arrow) file. [default: data/new_gen_wrangled.csv]
 --RESULTS_FILE_PATH=<RESULTS_FILE_PATH>  Path to output Results table. [default: results/pokemon_models.csv]
 --IMPORTANCES_FILE_PATH=<IMPORTANCES_FILE_PATH>  Path to output Feature Importance table. [default: results/pokemon_feature_importances.csv]
 --MODEL_DUMP_PATH=<MODEL_DUMP_PATH>  Path to output Models table. [default: results/models/final_model.pic]
@@ -18,69 +18,133 @@ Options:
 --RESULTS_FINAL_PATH=<RESULTS_FINAL_PATH>  Path to output Final model's Results table. [default: results/pokemon_final_model.csv]
 --FINAL_PREDICTION_PATH=<FINAL_PREDICTION_PATH>  Path to output Final model's predictions. [default: results/pokemon_final_prediction.csv]
 --NEWGEN_PREDICTION_PATH=<NEWGEN_PREDICTION>  Path to output Final model's predictions on the new gen. [default: results/pokemon_newgen_prediction.csv]
+--N_JOBS=<N_JOBS>  Number of processes used to fit the models at the same time, -1 uses all cores. [default: 1]
+--USE_FEATURE_STORE=<USE_FEATURE_STORE>  True to load the transformed matrices from the feature store (and save them there when missing), False otherwise. [default: False]
+--FEATURE_STORE_PATH=<FEATURE_STORE_PATH>  Folder of the feature store. [default: results/feature_store/]
+--PREDICT_ONLY=<PREDICT_ONLY>  True to skip the training and predict NEW_GEN_PATH with the model in MODEL_DUMP_PATH, False otherwise. [default: False]
+--CHUNK_SIZE=<CHUNK_SIZE>  Number of rows of the new generation csv read, predicted and written at a time, 0 predicts the whole file at once. [default: 0]
+--APPEND=<APPEND>  True to append the predictions to NEWGEN_PREDICTION_PATH instead of overwriting it, e.g. to predict only the rows appended by wrangling.py --APPEND=True (NEW_GEN_PATH=data/new_gen_delta.csv). Only used with PREDICT_ONLY. [default: False]
+--SPLIT=<SPLIT>  random to split the train data into train and validation with train_test_split, hash to assign each row by a hash of its Number and Name. [default: random]
+--CV_FOLDS=<CV_FOLDS>  Number of stratified folds used to cross-validate every model on the whole train data, 0 only evaluates the models in the validation set. [default: 0]
+--CV_REPEATS=<CV_REPEATS>  Number of times the cross-validation is repeated with different folds. [default: 1]
+--CV_RESULTS_PATH=<CV_RESULTS_PATH>  Path to output the mean and standard deviation of the cross-validation accuracies of each model. [default: results/pokemon_models_cv.csv]
+--CV_FOLD_RESULTS_PATH=<CV_FOLD_RESULTS_PATH>  Path to output the accuracies and timings of each model in each fold. [default: results/pokemon_models_cv_folds.csv]
+--TUNE=<TUNE>  True to tune the hyperparameters of each model with successive halving (see tuning.py), scoring the configurations in a held out part of the train rows, before evaluating it, False to use the fixed ones. The best parameters and the search trace are saved next to RESULTS_FILE_PATH. [default: False]
+--TUNE_BUDGET=<TUNE_BUDGET>  Seconds the tuning may take, the fits still running then are stopped and no new round starts. [default: 300]
+--TUNE_CONFIGS=<TUNE_CONFIGS>  Number of random configurations of each model in the first round of the tuning. [default: 16]
+--MODEL_TIMEOUT=<MODEL_TIMEOUT>  Seconds each model (and each tuning configuration and cross-validation fold) may take to fit and score, the models that take longer are stopped and marked as timed out in the results. 0 for no limit. [default: 0]
+--TIME_BUDGET=<TIME_BUDGET>  Seconds the whole model evaluation (tuning, evaluation and cross-validation) may take, the models still running (or not started) then are stopped and marked as timed out. When the chosen model timed out the finished model with the best validation accuracy is used instead. 0 for no limit. [default: 0]
+--SVM_MODE=<SVM_MODE>  exact to fit the RBF SVM models with SVC, nystroem or rff to approximate the RBF kernel (Nystroem or random Fourier features) and fit a linear SVM on it, which scales to many more rows. [default: exact]
+--PROFILE_PATH=<PROFILE_PATH>  Path of a JSON lines file where the wall time, CPU time and peak memory of each stage (load, split, preprocess, tune, evaluate, cross_validate, plot, test, dump, predict_new_gen) and of each model fit are appended (see profiling.py). None to disable the profiling. [default: None]
+--PROFILE_STAGE=<PROFILE_STAGE>  Name of a stage run under cProfile, its stats are dumped next to PROFILE_PATH. None for no stage. [default: None]
+--USE_CACHE=<USE_CACHE>  True to restore the outputs from the stage cache when the inputs and options did not change, False otherwise. [default: False]
+--CACHE_DIR=<CACHE_DIR>  Folder of the stage cache. [default: results/.stage_cache/]
 '''
 
 from docopt import docopt
 
-# Modeling 
-
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.multiclass import OneVsOneClassifier, OneVsRestClassifier
-from sklearn.dummy import DummyClassifier
-from lightgbm import LGBMClassifier
-from xgboost import XGBClassifier
-from sklearn.model_selection import GridSearchCV
-
-# Pipeline
-
-from sklearn.pipeline import Pipeline
-
-# Preprocessing
-
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+# Heavy libraries (sklearn models, lightgbm, xgboost, altair) are imported 
+# inside the functions that use them, so the script starts fast
 
 # Data structures
 
+import numpy as np
 import pandas as pd
 
-# Plotting
-
-import altair as alt
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-
 # Other
 import os
 import sys
 import pickle
+import json
 import time
 
-#driver = webdriver.Chrome(ChromeDriverManager().install())
-browser = webdriver.Chrome('C:\webdrivers\chromedriver.exe')
-opt = docopt(__doc__)
+from parallel import SHARED, run_parallel
+from profiling import configure_profile, profile_stage, profiled_call, record
+from schema import read_wrangled
+from splitting import ID_COLUMNS, VALID_SPLIT_KEY, in_first_part
+from stage_cache import run_cached
+from feature_store import code_digest, feature_key, save_features, load_features
+
+MODEL_NAMES = ['decision tree', 'kNN', 'OVR - logistic regression', 'OVR - RBF SVM',
+               'OVO - logistic regression', 'OVO - RBF SVM', 'random forest', 
+               'xgboost', 'lgbm', 'Dummy']
 
 def main(data_file_path, test_file_path, new_gen_path, results_file_path, importances_file_path, model_dump_path, importance_plot_path, 
-         cat_features, num_features, final_path, final_prediction_path, new_gen_prediction_path):
+         cat_features, num_features, final_path, final_prediction_path, new_gen_prediction_path, n_jobs=1,
+         use_feature_store='False', feature_store_path='results/feature_store/', chunk_size=0, split='random',
+         cv_folds=0, cv_repeats=1, cv_results_path='results/pokemon_models_cv.csv', 
+         cv_fold_results_path='results/pokemon_models_cv_folds.csv', tune='False', tune_budget=300, tune_configs=16,
+         model_timeout=0, time_budget=0, svm_mode='exact'):
     assert os.path.isfile(data_file_path), "TRAIN_FILE_PATH does not exist"
     assert os.path.isfile(test_file_path), "TEST_FILE_PATH does not exist"
     assert os.path.isfile(new_gen_path), "NEW_GEN_PATH does not exist"
     
-    print("Model evaluation - Starting \n")
-    data = pd.read_csv(data_file_path)
-    test_data = pd.read_csv(test_file_path)
-    new_gen = pd.read_csv(new_gen_path)
+    all_features = cat_features.split(",") + num_features.split(",")
+    
+    id_columns = ID_COLUMNS if split == 'hash' else []
+    
+    with profile_stage('load'):
+        data = read_wrangled(data_file_path, usecols = all_features + id_columns + ['Tier_2'])
+        test_data = read_wrangled(test_file_path)
+        
+        # In streaming mode the new generation is only read, chunk by chunk, to predict it
+        
+        new_gen = read_wrangled(new_gen_path) if int(chunk_size) == 0 else None
+    
+    final_model = run_modeling(data, test_data, new_gen, results_file_path, importances_file_path, model_dump_path, 
+                               importance_plot_path, cat_features, num_features, final_path, final_prediction_path, 
+                               new_gen_prediction_path, n_jobs, use_feature_store, feature_store_path,
+                               sources = [data_file_path, test_file_path, new_gen_path], split = split,
+                               cv_folds = cv_folds, cv_repeats = cv_repeats, cv_results_path = cv_results_path,
+                               cv_fold_results_path = cv_fold_results_path, tune = tune, 
+                               tune_budget = tune_budget, tune_configs = tune_configs, 
+                               model_timeout = model_timeout, time_budget = time_budget, svm_mode = svm_mode)
+    
+    if new_gen is None:
+        print("Testing Model on New Generation - final model... \n", end='')
+        with profile_stage('predict_new_gen'):
+            predict_new_gen_stream(new_gen_path, new_gen_prediction_path, all_features, final_model, int(chunk_size))
+    
+    print("Model evaluation - Finished")
+
+def run_modeling(data, test_data, new_gen, results_file_path, importances_file_path, model_dump_path, importance_plot_path, 
+                 cat_features, num_features, final_path, final_prediction_path, new_gen_prediction_path, n_jobs=1,
+                 use_feature_store='False', feature_store_path='results/feature_store/', sources=None, split='random',
+                 cv_folds=0, cv_repeats=1, cv_results_path='results/pokemon_models_cv.csv', 
+                 cv_fold_results_path='results/pokemon_models_cv_folds.csv', tune='False', tune_budget=300, tune_configs=16,
+                 model_timeout=0, time_budget=0, svm_mode='exact'):
+    """
+    Evaluates the models, tests the chosen one and predicts the new generation from dataframes already in memory,
+    so the wrangled data does not need to be written and parsed again (e.g. by run_pipeline.py)
     
+    Parameters:
+    data -- (dataframe) wrangled train data
+    test_data -- (dataframe) wrangled test data
+    new_gen -- (dataframe) wrangled new generation, None to skip its prediction
+    sources -- (list) files the dataframes were read from, used as the feature store key instead of hashing the dataframes
+    split -- (string) 'random' or 'hash', how the train data is split into train and validation
+    cv_folds -- (int) number of cross-validation folds, 0 skips the cross-validation
+    cv_repeats -- (int) number of repetitions of the cross-validation
+    cv_results_path -- (string) path to output the cross-validation summary
+    cv_fold_results_path -- (string) path to output the results of each fold
+    tune -- (string) 'True' to tune the models before evaluating them
+    tune_budget -- (float) seconds the tuning may take
+    tune_configs -- (int) number of configurations of each model in the first round of the tuning
+    model_timeout -- (float) seconds each model may take in the tuning, the evaluation and the cross-validation, 0 for no limit
+    time_budget -- (float) seconds the tuning, the evaluation and the cross-validation may take together, 0 for no limit
+    svm_mode -- (string) 'exact', 'nystroem' or 'rff', how the RBF SVM models are fitted
+    The other parameters are the ones of main
+    
+    Returns: 
+    final_model -- (sklearn.pipeline.Pipeline) chosen model
+    """
+    print("Model evaluation - Starting \n")
     categorical_features = cat_features.split(",")
     numeric_features = num_features.split(",")
     all_features = categorical_features + numeric_features
     
+    test_data = test_data.copy()
+    
     print(f"Used features: {all_features} \n")
     
     X = data[all_features]
@@ -89,28 +153,69 @@ def main(data_file_path, test_file_path, new_gen_path, results_file_path, import
     y_test = test_data['Tier_2']
     
     print("Splitting the data... \n", end='')
-    X_valid, X_train, y_valid, y_train = data_splitting(X, y, 0.7)
+    ids = data[ID_COLUMNS] if split == 'hash' else None
+    with profile_stage('split'):
+        X_valid, X_train, y_valid, y_train = data_splitting(X, y, 0.7, split, ids)
     
     print("Setting the preprocessor... \n", end='')
     preprocessor = preprocessing(categorical_features, numeric_features)
     
-    models = {
-          'decision tree': DecisionTreeClassifier(),
-          'kNN': KNeighborsClassifier(n_neighbors=15),
-          'OVR - logistic regression': OneVsRestClassifier(LogisticRegression(solver ='lbfgs', class_weight='balanced')),
-          'OVR - RBF SVM' :  OneVsRestClassifier(SVC(gamma = 'scale', class_weight='balanced')), 
-          'OVO - logistic regression': OneVsOneClassifier(LogisticRegression(solver ='lbfgs', class_weight='balanced')),
-          'OVO - RBF SVM' :  OneVsOneClassifier(SVC(gamma = 'scale', class_weight='balanced')), 
-          'random forest' : RandomForestClassifier(n_estimators=15, max_depth=5), 
-          'xgboost' : XGBClassifier(n_estimators=30),
-          'lgbm': LGBMClassifier(n_estimators=15, max_depth=5),
-          'Dummy': DummyClassifier()
-         }
+    datasets = {'train': X_train, 'valid': X_valid, 'test': X_test}
+    
+    if new_gen is not None:
+        datasets['new_gen'] = new_gen[all_features]
+    
+    matrices = None
+    
+    if use_feature_store == 'True':
+        import sklearn
+        
+        # A change in the preprocessing code or in sklearn must not reuse the stored preprocessor and matrices
+        
+        key = feature_key(sources or [data, test_data, new_gen], 
+                          categorical_features, numeric_features, 
+                          extra = f'train_size=0.7,random_state=1234,split={split},datasets={sorted(datasets)},'
+                                  f'code={code_digest(preprocessing, transform_data)},sklearn={sklearn.__version__}')
+        matrices, stored_preprocessor = load_features(feature_store_path, key)
+    
+    if matrices is None:
+        print("Transforming the data... \n", end='')
+        with profile_stage('preprocess'):
+            matrices = transform_data(preprocessor, datasets)
+        if use_feature_store == 'True':
+            print("Saving the transformed data in the feature store... \n", end='')
+            save_features(feature_store_path, key, matrices, preprocessor)
+    else:
+        print("Loading the transformed data from the feature store... \n", end='')
+        preprocessor = stored_preprocessor
+    
+    models = {model_name: make_model(model_name, svm_mode) for model_name in MODEL_NAMES}
+    
+    # With a timeout or a budget each fit runs in its own process, stopped when it takes too long
+    
+    timeout = float(model_timeout) if float(model_timeout) > 0 else None
+    deadline = time.time() + float(time_budget) if float(time_budget) > 0 else None
+    
+    if tune == 'True':
+        from tuning import tune_models
+        
+        print(f"Tuning models (budget of {tune_budget} seconds)... \n", end='')
+        with profile_stage('tune'):
+            best_params, trace = tune_models(models, matrices['train'], y_train, float(tune_budget), 
+                                             int(tune_configs), n_jobs, timeout = timeout, deadline = deadline)
+        for model_name, params in best_params.loc[best_params['Status'] == 'tuned', 'Params'].items():
+            models[model_name].set_params(**json.loads(params))
+        
+        best_params.to_csv(tuning_paths(results_file_path)[0])
+        trace.to_csv(tuning_paths(results_file_path)[1])
+        print(best_params[['Params', 'Holdout Accuracy', 'Status']])
     
     print("Evaluating models... \n", end='')
-    results, importances = evaluate_model(X_train, y_train, X_valid, 
-                                          y_valid, preprocessor, models,
-                                          categorical_features, numeric_features)
+    with profile_stage('evaluate'):
+        results, importances, predictions = evaluate_model(matrices['train'], y_train, matrices['valid'], 
+                                              y_valid, preprocessor, models,
+                                              categorical_features, numeric_features,
+                                              n_jobs, timeout, deadline)
     
     # Turning the dictionary into a df
     
@@ -118,43 +223,161 @@ def main(data_file_path, test_file_path, new_gen_path, results_file_path, import
     results_df.columns = ["Model", 
                           "Train Accuracy", 
                           "Validation Accuracy", 
-                          "Time in seconds"]
+                          "Time in seconds",
+                          "CPU time in seconds",
+                          "Status"]
+    
     
+    # Choosing the final model before writing any result, so a run where no model finished leaves no partial results
+    
+    chosen_model = choose_model(results)
     
     print("Printing results... \n", end='')
     results_df.to_csv(results_file_path)
-    print(results_df[['Train Accuracy', 'Validation Accuracy']])
+    print(results_df[['Train Accuracy', 'Validation Accuracy', 'Status']])
+    
+    if int(cv_folds) > 0:
+        print(f"Cross-validating models ({cv_folds} folds, {cv_repeats} repeats)... \n", end='')
+        with profile_stage('cross_validate'):
+            cv_results, fold_results = cross_validate(X, y, models, categorical_features, numeric_features, 
+                                                      int(cv_folds), int(cv_repeats), n_jobs, timeout, deadline)
+        
+        cv_results.to_csv(cv_results_path)
+        fold_results.to_csv(cv_fold_results_path)
+        print(cv_results[['Mean Validation Accuracy', 'Std Validation Accuracy']])
     
     print("Printing importances... \n", end='')
     importances.to_csv(importances_file_path)
     
     print("Saving plots... \n", end='')
-    plot_feature_importance(importances, importance_plot_path)
+    with profile_stage('plot'):
+        plot_feature_importance(importances, importance_plot_path)
     print(f"Importance plot saved in {importance_plot_path}")
     
-    chosen_model = 'OVO - logistic regression'
     print(f"The chosen model is {chosen_model}\n", end='')
     final_model = results[chosen_model][0]
-    test_results, predictions = test_model(X_train, y_train, X_test, y_test, final_model, chosen_model)
-    test_data['Prediction'] = predictions
+    final_classifier = final_model.named_steps['classifier']
+    with profile_stage('test'):
+        test_results, test_predictions = test_model(matrices['train'], y_train, matrices['test'], y_test, 
+                                                    final_classifier, chosen_model, predictions)
+    test_data['Prediction'] = test_predictions
     
     print("Dumping models... \n", end='')
-    dump_model(model_dump_path, final_model)
+    with profile_stage('dump'):
+        dump_model(model_dump_path, final_model)
     
     print("Printing results - final model... \n", end='')
     test_results.to_csv(final_path)
     print(test_results)
+    print(pd.crosstab(y_test.to_numpy(), test_predictions, rownames = ['Tier_2'], colnames = ['Prediction']))
     
     print("Printing test predictions - final model... \n", end='')
     test_data.to_csv(final_prediction_path)
     
-    print("Testing Model on New Generation - final model... \n", end='')
-    new_gen['Prediction'] = predict_new_gen(new_gen, all_features, final_model)
+    if new_gen is not None:
+        print("Testing Model on New Generation - final model... \n", end='')
+        new_gen = new_gen.copy()
+        with profile_stage('predict_new_gen'):
+            new_gen['Prediction'] = cached_predict(predictions, chosen_model, 'new_gen', final_classifier, 
+                                                   matrices['new_gen'])
+        
+        print("Printing New Generation's Predictions - final model... \n", end='')
+        new_gen.to_csv(new_gen_prediction_path)
     
-    print("Printing New Generation's Predictions - final model... \n", end='')
-    new_gen.to_csv(new_gen_prediction_path)
+    return final_model
+
+def tuning_paths(results_file_path):
+    """
+    Paths of the tuning outputs, next to the results table
     
-    print("Model evaluation - Finished")
+    Parameters:
+    results_file_path -- (string) path of the results table
+    
+    Returns: 
+    best_params_path -- (string) path of the best parameters of each model
+    trace_path -- (string) path of the search trace
+    """
+    root, extension = os.path.splitext(results_file_path)
+    
+    return f'{root}_best_params{extension}', f'{root}_tuning_trace{extension}'
+
+def choose_model(results, preferred_model='OVO - logistic regression'):
+    """
+    Chooses the final model among the models that finished: the preferred one, or the one with
+    the best validation accuracy when the preferred one timed out. The Dummy baseline is never chosen
+    
+    Parameters:
+    results -- (dictionary) results of evaluate_model
+    preferred_model -- (string) name of the model chosen when it finished
+    
+    Returns: 
+    chosen_model -- (string) name of the chosen model
+    """
+    finished = {model_name: result for model_name, result in results.items() 
+                if result[-1] == 'ok' and model_name != 'Dummy'}
+    
+    if not finished:
+        raise RuntimeError("No model finished within MODEL_TIMEOUT and TIME_BUDGET, increase them")
+    
+    if preferred_model in finished:
+        return preferred_model
+    
+    chosen_model = max(finished, key = lambda model_name: finished[model_name][2])
+    print(f"{preferred_model} timed out, choosing the finished model with the best validation accuracy")
+    
+    return chosen_model
+
+def make_model(model_name, svm_mode='exact'):
+    """
+    Creates one of the candidate models. The library of the model is only imported here
+    
+    Parameters:
+    model_name -- (string) name of the model, one of MODEL_NAMES
+    svm_mode -- (string) 'exact' for SVC, 'nystroem' or 'rff' for the approximate RBF SVM of approximate_svm.py
+    
+    Returns: 
+    model -- (model object) unfitted model
+    """
+    if model_name == 'decision tree':
+        from sklearn.tree import DecisionTreeClassifier
+        return DecisionTreeClassifier()
+    
+    if model_name == 'kNN':
+        from sklearn.neighbors import KNeighborsClassifier
+        return KNeighborsClassifier(n_neighbors=15)
+    
+    if model_name in ['OVR - logistic regression', 'OVO - logistic regression']:
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.multiclass import OneVsOneClassifier, OneVsRestClassifier
+        wrapper = OneVsRestClassifier if model_name.startswith('OVR') else OneVsOneClassifier
+        return wrapper(LogisticRegression(solver ='lbfgs', class_weight='balanced'))
+    
+    if model_name in ['OVR - RBF SVM', 'OVO - RBF SVM']:
+        from sklearn.svm import SVC
+        from sklearn.multiclass import OneVsOneClassifier, OneVsRestClassifier
+        wrapper = OneVsRestClassifier if model_name.startswith('OVR') else OneVsOneClassifier
+        if svm_mode != 'exact':
+            from approximate_svm import ApproximateRBFSVC
+            return wrapper(ApproximateRBFSVC(gamma = 'scale', method = svm_mode, class_weight='balanced'))
+        return wrapper(SVC(gamma = 'scale', class_weight='balanced'))
+    
+    if model_name == 'random forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(n_estimators=15, max_depth=5)
+    
+    if model_name == 'xgboost':
+        from xgboost import XGBClassifier
+        return XGBClassifier(n_estimators=30)
+    
+    if model_name == 'lgbm':
+        from lightgbm import LGBMClassifier
+        return LGBMClassifier(n_estimators=15, max_depth=5)
+    
+    if model_name == 'Dummy':
+        from sklearn.dummy import DummyClassifier
+        return DummyClassifier()
+    
+    raise ValueError(f"Unknown model: {model_name}")
 
 def preprocessing(categorical_features, numeric_features):
     """
@@ -167,8 +390,17 @@ def preprocessing(categorical_features, numeric_features):
     Returns: 
     preprocessor -- (sklearn.compose.ColumnTransformer) one hot encoding preprocessor
     """
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+
+    # The categorical and boolean columns of the schema are turned into a single object 
+    # array, which is what the imputer expects for strings
 
     categorical_transformer = Pipeline(steps=[
+                                          ('object', FunctionTransformer(np.asarray, 
+                                                                         kw_args={'dtype': object})),
                                           ('imputer', SimpleImputer(strategy='constant', 
                                                                     fill_value='no type')),
                                           ('onehot', OneHotEncoder(handle_unknown='ignore'))
@@ -186,13 +418,51 @@ def preprocessing(categorical_features, numeric_features):
 
     return preprocessor
 
-def data_splitting(X, y, train_test_size):
+def transform_data(preprocessor, datasets):
+    """
+    Fits the preprocessor once in the train set and transforms every dataset with it, so the
+    models are fitted and scored on the same design matrices. The matrices are sparse 
+    whenever the ColumnTransformer output is sparse.
+    
+    Parameters:
+    preprocessor -- (sklearn.compose.ColumnTransformer) one hot encoding preprocessor
+    datasets -- (dictionary) dictionary of dataframes, it must contain a 'train' key
+    
+    Returns:
+    matrices -- (dictionary) dictionary with the transformed design matrix of each dataset
+    """
+    preprocessor.fit(datasets['train'])
+    
+    matrices = {name: preprocessor.transform(X) for name, X in datasets.items()}
+    
+    return matrices
+
+def build_pipeline(preprocessor, model):
+    """
+    Joins a fitted preprocessor and a fitted model in a pipeline that works on raw dataframes
+    
+    Parameters:
+    preprocessor -- (sklearn.compose.ColumnTransformer) fitted preprocessor
+    model -- (model object) model fitted on the output of the preprocessor
+    
+    Returns:
+    clf -- (sklearn.pipeline.Pipeline) fitted pipeline
+    """
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline(steps=[('preprocessor', preprocessor),
+                           ('classifier', model)])
+
+def data_splitting(X, y, train_test_size, split='random', ids=None):
     """
     Splits the data into a validation and a train set
     
     Parameters:
     X -- (dataframe) Explanatory variables matrix
     y -- (series) Response variable series
+    train_test_size -- (float) share of the rows in the first set (the validation set)
+    split -- (string) 'random' to use train_test_split, 'hash' to assign each row by a hash of its ids
+    ids -- (dataframe) identity columns of each row (Number and Name), only used by the hash split
     
     Returns:
     X_valid -- (dataframe) validation X
@@ -200,35 +470,105 @@ def data_splitting(X, y, train_test_size):
     y_valid -- (series) validation y
     y_train -- (series) train y
     """
+    if split == 'hash':
+        in_valid = in_first_part(ids, train_test_size, VALID_SPLIT_KEY)
+        return X[in_valid], X[~in_valid], y[in_valid], y[~in_valid]
+
+    from sklearn.model_selection import train_test_split
 
     X_valid, X_train, y_valid, y_train = train_test_split(X, y, train_size=train_test_size, random_state = 1234)
     
     return X_valid, X_train, y_valid, y_train
 
 
-def evaluate_model(X_train, y_train, X_valid, y_valid, preprocessor, models, categorical_features, numeric_features):
+def accuracy(y, predictions):
+    """
+    Accuracy of predictions already made, the same as model.score without predicting again
+    
+    Parameters:
+    y -- (series) true labels
+    predictions -- (array) predicted labels
+    
+    Returns:
+    accuracy -- (float) share of correct predictions
+    """
+    return float(np.mean(np.asarray(y) == np.asarray(predictions)))
+
+def cached_predict(predictions, model_name, dataset_name, model, X):
+    """
+    Predicts a dataset with a model only once, later calls return the cached predictions
+    
+    Parameters:
+    predictions -- (dictionary) prediction cache keyed by (model name, dataset name)
+    model_name -- (string) name of the model
+    dataset_name -- (string) name of the dataset (e.g. 'train', 'valid', 'test')
+    model -- (model object) fitted model
+    X -- (matrix) transformed X of the dataset
+    
+    Returns:
+    predictions -- (array) predicted labels
+    """
+    key = (model_name, dataset_name)
+    
+    if key not in predictions:
+        predictions[key] = model.predict(X)
+    
+    return predictions[key]
+
+def fit_model(model, X_train, y_train, X_valid, y_valid):
+    """
+    Fits a model on the transformed train matrix and scores it in the train and validation sets.
+    Each set is predicted once and the predictions are returned, so they are not made again later
+
+    Parameters:
+    model -- (model object) model to fit
+    X_train -- (matrix) transformed train X
+    y_train -- (series) train y
+    X_valid -- (matrix) transformed validation X
+    y_valid -- (series) validation y
+
+    Returns:
+    model -- (model object) fitted model
+    tr_acc -- (float) train accuracy
+    valid_acc -- (float) validation accuracy
+    predictions -- (dictionary) train and validation predictions
+    """
+    model.fit(X_train, y_train);
+    predictions = {'train': model.predict(X_train), 'valid': model.predict(X_valid)}
+    tr_acc, valid_acc = accuracy(y_train, predictions['train']), accuracy(y_valid, predictions['valid'])
+
+    return model, tr_acc, valid_acc, predictions
+
+def evaluate_model(X_train, y_train, X_valid, y_valid, preprocessor, models, categorical_features, numeric_features, n_jobs=1,
+                   timeout=None, deadline=None):
     """
     Evaluates a group of models
 
     Parameters:
-    X_valid -- (dataframe) validation X
-    X_train -- (dataframe) train X
+    X_valid -- (matrix) transformed validation X
+    X_train -- (matrix) transformed train X
     y_valid -- (series) validation y
     y_train -- (series) train y
-    preprocessor -- (sklearn.compose.ColumnTransformer) one hot encoding preprocessor
+    preprocessor -- (sklearn.compose.ColumnTransformer) preprocessor fitted by transform_data
     models -- (dictionary) models dictionary
+    n_jobs -- (int) number of models fitted at the same time
+    timeout -- (float) seconds each model may take, None for no limit
+    deadline -- (float) time.time() after which the models still running are stopped, None for no limit
     
     Returns:
-    results -- (dictionary) dictionary containing model, train error, validation error
-    and elapsed training and validation time
+    results -- (dictionary) dictionary containing model (as a fitted pipeline), train error, validation error,
+    elapsed training and validation time, its CPU time and its status ('ok' or 'timed out', in which case
+    the model and the errors are missing)
     
     importances -- (dataframe) feature importances
+    
+    predictions -- (dictionary) prediction cache with the train and validation predictions of each model,
+    keyed by (model name, dataset name)
     """
     results = {}
+    predictions = {}
     
-    # Retrieving the names of the variables just once
-    
-    preprocessor.fit(X_train)
+    # Retrieving the names of the variables from the fitted preprocessor
     
     categorical_names = pd.DataFrame(preprocessor.named_transformers_['cat']\
                                                  .named_steps['onehot']\
@@ -247,22 +587,28 @@ def evaluate_model(X_train, y_train, X_valid, y_valid, preprocessor, models, cat
                  'OVO - logistic regression', 'OVO - RBF SVM', 'Dummy',
                  'lgbm']
         
-    for model_name, model in models.items():
-        
-        # Timing the model
-        
-        t = time.time()
-
-        # Fitting the model as a pipeline
-        
-        clf = Pipeline(steps=[('preprocessor', preprocessor),
-                              ('classifier', model)])
-        clf.fit(X_train, y_train);
-        tr_acc, valid_acc = clf.score(X_train, y_train), clf.score(X_valid, y_valid)
+    # Fitting and scoring the models, each one is timed (and its peak memory measured) by the process that runs it
+    
+    tasks = [(fit_model, model, X_train, y_train, X_valid, y_valid) 
+             for model_name, model in models.items()]
+    outputs = run_parallel(profiled_call, tasks, n_jobs, timeout, deadline)
+    
+    for model_name, (output, elapsed_time, cpu_time) in zip(models, outputs):
         
-        elapsed_time = time.time() - t
+        if output is None:
+            print(f"{model_name} timed out after {round(elapsed_time, 2)} seconds")
+            results[model_name] = [None, None, None, round(elapsed_time,4), None, 'timed out']
+            record('fit', model = model_name, wall_time = round(elapsed_time, 4), cpu_time = None, 
+                   peak_rss_mb = None, status = 'timed out')
+            continue
         
-        results[model_name] = [clf, round(tr_acc,3), round(valid_acc,3), round(elapsed_time,4)]
+        (model, tr_acc, valid_acc, model_predictions), peak_rss = output
+        predictions.update({(model_name, dataset_name): dataset_predictions 
+                            for dataset_name, dataset_predictions in model_predictions.items()})
+        record('fit', model = model_name, wall_time = round(elapsed_time, 4), cpu_time = round(cpu_time, 4),
+               peak_rss_mb = peak_rss, status = 'ok')
+        clf = build_pipeline(preprocessor, model)
+        results[model_name] = [clf, round(tr_acc,3), round(valid_acc,3), round(elapsed_time,4), round(cpu_time,4), 'ok']
        
         # Not evaluating importances for those models in which it cannot be evaluated
         
@@ -272,7 +618,86 @@ def evaluate_model(X_train, y_train, X_valid, y_valid, preprocessor, models, cat
             importance_df = pd.concat([importance_df, importances], 
                                       axis = 1)
     
-    return results, importance_df
+    return results, importance_df, predictions
+
+def fit_fold(model, train_index, valid_index):
+    """
+    Fits a pipeline on the train rows of a fold and scores it in the train and validation rows.
+    The raw X and y of all the folds are read from the data shared with the process, and the 
+    preprocessor of the pipeline is fitted on the train rows of the fold only
+
+    Parameters:
+    model -- (sklearn.pipeline.Pipeline) unfitted preprocessor and model
+    train_index -- (array) positions of the train rows of the fold
+    valid_index -- (array) positions of the validation rows of the fold
+
+    Returns:
+    tr_acc -- (float) train accuracy
+    valid_acc -- (float) validation accuracy
+    """
+    X, y = SHARED['X'], SHARED['y']
+    _, tr_acc, valid_acc, _ = fit_model(model, X.iloc[train_index], y.iloc[train_index], 
+                                        X.iloc[valid_index], y.iloc[valid_index])
+
+    return tr_acc, valid_acc
+
+def cross_validate(X, y, models, categorical_features, numeric_features, n_folds, n_repeats=1, n_jobs=1, 
+                   timeout=None, deadline=None):
+    """
+    Cross-validates a group of models with repeated stratified folds. Every (model, fold) pair is 
+    an independent task, so all of them are fitted at the same time when n_jobs allows it.
+    Each task fits its own preprocessor on the train rows of its fold, so the validation rows 
+    do not leak into the scaling or the encoding. The raw X is handed to each process once and 
+    not sent with every task
+
+    Parameters:
+    X -- (dataframe) explanatory variables
+    y -- (series) response variable
+    models -- (dictionary) models dictionary
+    categorical_features -- (list) list of categorical features to preprocess
+    numeric_features -- (list) list of numerical features to preprocess
+    n_folds -- (int) number of folds
+    n_repeats -- (int) number of repetitions with different folds
+    n_jobs -- (int) number of fits at the same time
+    timeout -- (float) seconds each fold may take, None for no limit
+    deadline -- (float) time.time() after which the folds still running are stopped, None for no limit
+    
+    Returns:
+    cv_results -- (dataframe) mean and standard deviation of the accuracies (over the finished folds), 
+    the fit time and the number of finished folds of each model
+    fold_results -- (dataframe) accuracies, wall time, CPU time and status ('ok' or 'timed out') of each model in each fold
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import RepeatedStratifiedKFold
+    
+    folds = list(RepeatedStratifiedKFold(n_splits = n_folds, n_repeats = n_repeats, random_state = 1234).split(X, y))
+    
+    task_models = [model_name for model_name in models for _ in folds]
+    tasks = [(build_pipeline(preprocessing(categorical_features, numeric_features), clone(model)), train_index, valid_index) 
+             for model in models.values() for train_index, valid_index in folds]
+    outputs = run_parallel(fit_fold, tasks, n_jobs, timeout, deadline, shared = {'X': X, 'y': y})
+    
+    # The folds that timed out have no accuracies
+    
+    fold_results = pd.DataFrame([[model_name, i % len(folds) // n_folds, i % len(folds) % n_folds, 
+                                  *(np.round(output, 3) if output is not None else (np.nan, np.nan)), 
+                                  round(elapsed_time, 4), round(cpu_time, 4) if cpu_time is not None else np.nan,
+                                  'ok' if output is not None else 'timed out']
+                                 for i, (model_name, (output, elapsed_time, cpu_time)) in enumerate(zip(task_models, outputs))],
+                                columns = ['Model', 'Repeat', 'Fold', 'Train Accuracy', 'Validation Accuracy', 
+                                           'Time in seconds', 'CPU time in seconds', 'Status'])
+    
+    grouped = fold_results.groupby('Model', sort = False)
+    cv_results = pd.DataFrame({
+        'Mean Train Accuracy': grouped['Train Accuracy'].mean(),
+        'Mean Validation Accuracy': grouped['Validation Accuracy'].mean(),
+        'Std Validation Accuracy': grouped['Validation Accuracy'].std(ddof = 0),
+        'Mean time in seconds': grouped['Time in seconds'].mean(),
+        'Total time in seconds': grouped['Time in seconds'].sum(),
+        'Finished folds': grouped['Validation Accuracy'].count()
+    }).round(4)
+    
+    return cv_results, fold_results
 
 def dump_model(model_dump_path, model):
     """
@@ -284,6 +709,19 @@ def dump_model(model_dump_path, model):
     """
     with open(model_dump_path, 'wb') as fp:
         pickle.dump(model, fp)
+
+def load_model(model_dump_path):
+    """
+    Loads a model dumped with dump_model
+    
+    Parameters:
+    model_dump_path -- (string) path of the dumped model
+    
+    Returns:
+    model -- (model object) loaded model
+    """
+    with open(model_dump_path, 'rb') as fp:
+        return pickle.load(fp)
         
 def plot_feature_importance(data, importance_plot_path):
     """
@@ -293,6 +731,8 @@ def plot_feature_importance(data, importance_plot_path):
     data -- (dataframe) Importance dataframe
     importance_plot_path -- (string) path to print the plot
     """
+    import altair as alt
+
     data_melted = data.melt(id_vars = ['Features'],
                             var_name = 'Model',
                             value_name = 'Importance')
@@ -315,33 +755,38 @@ def plot_feature_importance(data, importance_plot_path):
         
     chart.save(importance_plot_path)
     
-def test_model(X, y, X_test, y_test,final_model, model_name):
+def test_model(X, y, X_test, y_test,final_model, model_name, predictions=None):
     """
-    Evaluates the final model in a test dataset
+    Evaluates the final model in a test dataset. Every dataset is predicted once, the train 
+    predictions made by evaluate_model are taken from the prediction cache
     
     Parameters:
-    X -- (dataframe) train X
+    X -- (dataframe or matrix) train X
     y -- (dataframe) train y
-    X_test -- (dataframe) test X
+    X_test -- (dataframe or matrix) test X
     y_test -- (dataframe) test y
     final_model -- (model) final model
     model_name -- (string) Name of the model
+    predictions -- (dictionary) prediction cache keyed by (model name, dataset name), the test predictions are added to it
     
     Returns: 
     results -- (dataframe) Dataframe with testing results
     predictions -- (array) Array with model predictions
     """
+    predictions = {} if predictions is None else predictions
+    
+    train_predictions = cached_predict(predictions, model_name, 'train', final_model, X)
+    test_predictions = cached_predict(predictions, model_name, 'test', final_model, X_test)
+    
     results = {
         'Model': model_name,
-        'Train accuracy': round(final_model.score(X, y),3),
-        'Test accuracy': round(final_model.score(X_test, y_test),3)
+        'Train accuracy': round(accuracy(y, train_predictions),3),
+        'Test accuracy': round(accuracy(y_test, test_predictions),3)
     }
-    
-    predictions = final_model.predict(X_test)
 
     results_df = pd.DataFrame(results, index = [0])
     
-    return results_df, predictions
+    return results_df, test_predictions
 
 def predict_new_gen(new_gen_data, features, final_model):
     """
@@ -359,9 +804,127 @@ def predict_new_gen(new_gen_data, features, final_model):
     predictions = final_model.predict(X)
     
     return predictions
+
+def predict_new_gen_stream(new_gen_path, new_gen_prediction_path, features, final_model, chunk_size, append=False):
+    """
+    Predicts the tier for a new generation csv chunk by chunk, appending each predicted
+    chunk to the output file, so the memory used does not grow with the size of the file
+    
+    Parameters:
+    new_gen_path -- (string) path of the wrangled new generation csv
+    new_gen_prediction_path -- (string) path to output the predictions
+    features -- (list) List of features used in the model
+    final_model -- (model) final model
+    chunk_size -- (int) number of rows predicted at a time
+    append -- (bool) True to append the predictions to an existing output file
+    
+    Returns: 
+    n_rows -- (int) number of predicted rows
+    """
+    t = time.time()
+    n_rows = 0
+    started = append and os.path.isfile(new_gen_prediction_path)
+    
+    for chunk in read_wrangled(new_gen_path, chunksize = chunk_size):
+        if len(chunk) == 0:
+            continue
+        chunk['Prediction'] = predict_new_gen(chunk, features, final_model)
+        chunk.to_csv(new_gen_prediction_path, mode = 'a' if started else 'w', header = not started)
+        started = True
+        n_rows += len(chunk)
+    
+    if not started:
+        # No rows to predict, the header-only output replaces the predictions of a previous run
+        empty = read_wrangled(new_gen_path).iloc[:0]
+        empty.assign(Prediction = pd.Series(dtype = 'object')).to_csv(new_gen_prediction_path)
+    
+    elapsed_time = time.time() - t
+    print(f"{n_rows} rows predicted in {round(elapsed_time, 2)} seconds "
+          f"({round(n_rows / max(elapsed_time, 1e-9))} rows per second)")
+    
+    return n_rows
+
+def predict_only(model_dump_path, new_gen_path, new_gen_prediction_path, cat_features, num_features, chunk_size=0, append='False'):
+    """
+    Predicts the new generation with an already dumped model, without training any model
+    
+    Parameters:
+    model_dump_path -- (string) path of the dumped final model
+    new_gen_path -- (string) path of the wrangled new generation csv
+    new_gen_prediction_path -- (string) path to output the predictions
+    cat_features -- (string) categorical features separated by commas
+    num_features -- (string) numerical features separated by commas
+    chunk_size -- (int) number of rows predicted at a time, 0 predicts the whole file at once
+    append -- (string) 'True' to append the predictions to new_gen_prediction_path instead of overwriting it
+    """
+    assert os.path.isfile(model_dump_path), "MODEL_DUMP_PATH does not exist"
+    assert os.path.isfile(new_gen_path), "NEW_GEN_PATH does not exist"
+    
+    features = cat_features.split(",") + num_features.split(",")
+    
+    print("Loading the final model... \n", end='')
+    with profile_stage('load_model'):
+        final_model = load_model(model_dump_path)
+    
+    if int(chunk_size) > 0:
+        print("Testing Model on New Generation by chunks - final model... \n", end='')
+        with profile_stage('predict_new_gen'):
+            predict_new_gen_stream(new_gen_path, new_gen_prediction_path, features, final_model, int(chunk_size),
+                                   append == 'True')
+        return
+    
+    with profile_stage('load'):
+        new_gen = read_wrangled(new_gen_path)
+    
+    if len(new_gen) == 0:
+        print("No rows to predict \n", end='')
+        if append != 'True' or not os.path.isfile(new_gen_prediction_path):
+            # The header-only output replaces the predictions of a previous run
+            new_gen.assign(Prediction = pd.Series(dtype = 'object')).to_csv(new_gen_prediction_path)
+        return
+    
+    print("Testing Model on New Generation - final model... \n", end='')
+    with profile_stage('predict_new_gen'):
+        new_gen['Prediction'] = predict_new_gen(new_gen, features, final_model)
+    
+    print("Printing New Generation's Predictions - final model... \n", end='')
+    if append == 'True' and os.path.isfile(new_gen_prediction_path):
+        new_gen.to_csv(new_gen_prediction_path, mode = 'a', header = False)
+    else:
+        new_gen.to_csv(new_gen_prediction_path)
     
 
 if __name__ == "__main__":
-     main(opt["--TRAIN_FILE_PATH"], opt["--TEST_FILE_PATH"], opt["--NEW_GEN_PATH"], opt["--RESULTS_FILE_PATH"], 
-          opt["--IMPORTANCES_FILE_PATH"], opt["--MODEL_DUMP_PATH"], opt["--IMPORTANCE_PLOT_PATH"], opt["--CATEGORICAL_FEATURES"],
-          opt["--NUMERICAL_FEATURES"], opt["--RESULTS_FINAL_PATH"], opt["--FINAL_PREDICTION_PATH"], opt["--NEWGEN_PREDICTION_PATH"])
\ No newline at end of file
+    opt = docopt(__doc__)
+    configure_profile(opt["--PROFILE_PATH"], opt["--PROFILE_STAGE"], 'modeling')
+
+    with profile_stage('total'):
+        if opt["--PREDICT_ONLY"] == 'True':
+            input_paths = [opt["--MODEL_DUMP_PATH"], opt["--NEW_GEN_PATH"]]
+            if opt["--APPEND"] == 'True' and os.path.isfile(opt["--NEWGEN_PREDICTION_PATH"]):
+                # The predictions already made are an input of the append
+                input_paths.append(opt["--NEWGEN_PREDICTION_PATH"])
+            run_cached('predict', input_paths, [opt["--NEWGEN_PREDICTION_PATH"]], opt,
+                       lambda: predict_only(opt["--MODEL_DUMP_PATH"], opt["--NEW_GEN_PATH"], opt["--NEWGEN_PREDICTION_PATH"],
+                                            opt["--CATEGORICAL_FEATURES"], opt["--NUMERICAL_FEATURES"], opt["--CHUNK_SIZE"],
+                                            opt["--APPEND"]),
+                       opt["--CACHE_DIR"], opt["--USE_CACHE"])
+        else:
+            output_paths = [opt["--RESULTS_FILE_PATH"], opt["--IMPORTANCES_FILE_PATH"], opt["--MODEL_DUMP_PATH"], 
+                            opt["--IMPORTANCE_PLOT_PATH"], opt["--RESULTS_FINAL_PATH"], opt["--FINAL_PREDICTION_PATH"], 
+                            opt["--NEWGEN_PREDICTION_PATH"]]
+            if int(opt["--CV_FOLDS"]) > 0:
+                output_paths += [opt["--CV_RESULTS_PATH"], opt["--CV_FOLD_RESULTS_PATH"]]
+            if opt["--TUNE"] == 'True':
+                output_paths += list(tuning_paths(opt["--RESULTS_FILE_PATH"]))
+            run_cached('modeling', [opt["--TRAIN_FILE_PATH"], opt["--TEST_FILE_PATH"], opt["--NEW_GEN_PATH"]], output_paths, opt,
+                       lambda: main(opt["--TRAIN_FILE_PATH"], opt["--TEST_FILE_PATH"], opt["--NEW_GEN_PATH"], opt["--RESULTS_FILE_PATH"], 
+                                    opt["--IMPORTANCES_FILE_PATH"], opt["--MODEL_DUMP_PATH"], opt["--IMPORTANCE_PLOT_PATH"], 
+                                    opt["--CATEGORICAL_FEATURES"], opt["--NUMERICAL_FEATURES"], opt["--RESULTS_FINAL_PATH"], 
+                                    opt["--FINAL_PREDICTION_PATH"], opt["--NEWGEN_PREDICTION_PATH"], opt["--N_JOBS"], 
+                                    opt["--USE_FEATURE_STORE"], opt["--FEATURE_STORE_PATH"], opt["--CHUNK_SIZE"], opt["--SPLIT"],
+                                    opt["--CV_FOLDS"], opt["--CV_REPEATS"], opt["--CV_RESULTS_PATH"], 
+                                    opt["--CV_FOLD_RESULTS_PATH"], opt["--TUNE"], opt["--TUNE_BUDGET"],
+                                    opt["--TUNE_CONFIGS"], opt["--MODEL_TIMEOUT"], opt["--TIME_BUDGET"],
+                                    opt["--SVM_MODE"]),
+                       opt["--CACHE_DIR"], opt["--USE_CACHE"])
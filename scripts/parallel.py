@@ -0,0 +1,166 @@
+'''Helpers to run independent tasks (model fits, folds, ...) on a pool of processes.'''
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+
+# Data shared by all the tasks of a run (e.g. the design matrix of the folds). It is handed to each
+# process once, when the process starts, instead of being pickled with every task
+SHARED = {}
+
+def share(shared):
+    """
+    Sets the data shared by the tasks that run in the current process
+
+    Parameters:
+    shared -- (dictionary) shared data, None keeps the current one
+    """
+    if shared is not None:
+        SHARED.clear()
+        SHARED.update(shared)
+
+def timed_call(func, *args):
+    """
+    Calls a function and measures its wall and CPU time
+
+    Parameters:
+    func -- (callable) function to call
+    args -- arguments passed to the function
+
+    Returns:
+    output -- output of the function
+    wall_time -- (float) elapsed wall time in seconds
+    cpu_time -- (float) CPU time in seconds spent by the calling process
+    """
+    t = time.time()
+    c = time.process_time()
+
+    output = func(*args)
+
+    return output, time.time() - t, time.process_time() - c
+
+def run_parallel(func, tasks, n_jobs=1, timeout=None, deadline=None, shared=None):
+    """
+    Runs func over a list of tasks, either sequentially or in a process pool.
+
+    The timing is done inside the process that runs the task, so wall and CPU
+    times are not mixed between tasks running at the same time. With a timeout
+    or a deadline each task runs in its own process, which is terminated when
+    the task takes too long.
+
+    The shared data is read by func from SHARED. It is set once in each process
+    of the pool (inherited without copying when processes are forked), so the tasks
+    only carry what differs between them (e.g. the rows of a fold).
+
+    Parameters:
+    func -- (callable) picklable function, called as func(*task)
+    tasks -- (list) list of tuples with the arguments of each call
+    n_jobs -- (int) number of processes. 1 runs everything in the current process, -1 uses all cores
+    timeout -- (float) seconds each task may run, None for no limit
+    deadline -- (float) time.time() after which running tasks are stopped and no task starts, None for no limit
+    shared -- (dictionary) data shared by all the tasks, available to func in SHARED
+
+    Returns:
+    outputs -- (list) list of (output, wall_time, cpu_time) in the same order as tasks. 
+    output and cpu_time are None for the tasks that were stopped or never started
+    """
+    n_jobs = int(n_jobs)
+
+    if timeout is not None or deadline is not None:
+        return run_with_timeouts(func, tasks, n_jobs, timeout, deadline, shared)
+
+    if n_jobs == 1 or len(tasks) <= 1:
+        share(shared)
+        try:
+            return [timed_call(func, *task) for task in tasks]
+        finally:
+            if shared is not None:
+                SHARED.clear()
+
+    with ProcessPoolExecutor(max_workers = n_jobs if n_jobs > 0 else None, 
+                             initializer = share, initargs = (shared,)) as executor:
+        futures = [executor.submit(timed_call, func, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+def run_task(connection, func, task, shared=None):
+    """
+    Runs a task in a child process and sends its timed output (or its error) to the parent
+
+    Parameters:
+    connection -- (multiprocessing.Connection) sending end of a pipe
+    func -- (callable) function to call
+    task -- (tuple) arguments of the call
+    shared -- (dictionary) data shared by all the tasks
+    """
+    try:
+        share(shared)
+        connection.send(('ok', timed_call(func, *task)))
+    except Exception as error:
+        connection.send(('error', error))
+    finally:
+        connection.close()
+
+def run_with_timeouts(func, tasks, n_jobs, timeout, deadline, shared=None):
+    """
+    Runs each task in its own process, at most n_jobs at the same time, and terminates
+    the processes that exceed the timeout or the deadline
+
+    Parameters:
+    func -- (callable) picklable function, called as func(*task)
+    tasks -- (list) list of tuples with the arguments of each call
+    n_jobs -- (int) number of processes, -1 uses all cores
+    timeout -- (float) seconds each task may run, None for no limit
+    deadline -- (float) time.time() after which running tasks are stopped and no task starts, None for no limit
+    shared -- (dictionary) data shared by all the tasks, only copied to the processes where they are not forked
+
+    Returns:
+    outputs -- (list) list of (output, wall_time, cpu_time) in the same order as tasks,
+    (None, wall_time, None) for the stopped tasks
+    """
+    n_jobs = n_jobs if n_jobs > 0 else os.cpu_count()
+    pending = list(enumerate(tasks))
+    running = {}
+    outputs = [None] * len(tasks)
+
+    try:
+        while pending or running:
+            while pending and len(running) < n_jobs:
+                i, task = pending.pop(0)
+                if deadline is not None and time.time() >= deadline:
+                    outputs[i] = (None, 0.0, None)
+                    continue
+                receiver, sender = multiprocessing.Pipe(duplex = False)
+                process = multiprocessing.Process(target = run_task, args = (sender, func, task, shared), 
+                                                  daemon = True)
+                process.start()
+                sender.close()
+                running[i] = (process, receiver, time.time())
+
+            ready = wait([receiver for _, receiver, _ in running.values()], timeout = 0.05)
+
+            for i, (process, receiver, start) in list(running.items()):
+                now = time.time()
+                if receiver in ready:
+                    try:
+                        status, output = receiver.recv()
+                    except EOFError:
+                        status, output = 'error', RuntimeError(f"The process of task {i} died")
+                    process.join()
+                    if status == 'error':
+                        raise output
+                    outputs[i] = output
+                elif (timeout is not None and now - start > timeout) or (deadline is not None and now > deadline):
+                    process.terminate()
+                    process.join()
+                    outputs[i] = (None, now - start, None)
+                else:
+                    continue
+                receiver.close()
+                del running[i]
+    finally:
+        for process, _, _ in running.values():
+            process.terminate()
+
+    return outputs
@@ -0,0 +1,314 @@
+'''This script starts a long-running prediction service around the dumped final model. The model is loaded once and
+the incoming requests are grouped in micro-batches, so each batch is predicted with one vectorized `predict` call.
+
+Requests are JSON objects with the Pokémon stats (a single row) or lists of them (a batch):
+    HTTP: POST /predict with the JSON as body, GET /stats for the latency and throughput report. A request with
+    missing or malformed features gets a 400 and a request the model fails to predict gets a 500
+    Unix socket: one JSON per line, the line `stats` returns the report
+
+Usage: prediction_server.py [--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>] [--HOST=<HOST>] [--PORT=<PORT>] [--SOCKET_PATH=<SOCKET_PATH>] [--MAX_BATCH=<MAX_BATCH>] [--MAX_WAIT_MS=<MAX_WAIT_MS>] [--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>] [--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>]
+
+Options:
+--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>  Path of the dumped final model, or of the model compiled by compiled_model.py. [default: results/models/final_model.pic]
+--HOST=<HOST>  Host of the HTTP server. [default: 127.0.0.1]
+--PORT=<PORT>  Port of the HTTP server. [default: 8000]
+--SOCKET_PATH=<SOCKET_PATH>  Path of a Unix socket to listen on instead of HTTP, None to use HTTP. [default: None]
+--MAX_BATCH=<MAX_BATCH>  Maximum number of rows predicted in one call. [default: 256]
+--MAX_WAIT_MS=<MAX_WAIT_MS>  Maximum milliseconds a request waits for other requests to fill its batch. [default: 2]
+--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>  String of categorical features separated by commas [default: Type1,Type2,Mega,Has_ST]
+--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>  String of numerical features separated by commas [default: HP,Attack,Defense,Special_attack,Special_defense,Speed]
+'''
+
+from docopt import docopt
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import pickle
+import queue
+import socketserver
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+def main(model_dump_path, host, port, socket_path, max_batch, max_wait_ms, cat_features, num_features):
+    assert os.path.isfile(model_dump_path), "MODEL_DUMP_PATH does not exist"
+
+    print("Loading the final model... \n", end='')
+    with open(model_dump_path, 'rb') as fp:
+        final_model = pickle.load(fp)
+
+    batcher = MicroBatcher(final_model, cat_features.split(","), num_features.split(","), int(max_batch),
+                           float(max_wait_ms))
+
+    if socket_path != 'None':
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path, make_socket_handler(batcher))
+        print(f"Serving predictions on unix socket {socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, int(port)), make_http_handler(batcher))
+        print(f"Serving predictions on http://{host}:{port}/predict")
+
+    server.daemon_threads = True
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(batcher.stats()))
+
+class PredictionError(Exception):
+    """
+    A request whose rows passed the checks but could not be predicted by the model
+    """
+
+class MicroBatcher:
+    """
+    Groups the rows of concurrent requests in batches and predicts each batch with a single call.
+
+    A request waits at most max_wait_ms for other requests to join its batch, and a batch
+    holds at most max_batch rows (a larger request is predicted on its own). The rows are checked
+    before they join a batch, and a batch that fails is predicted request by request, so a bad
+    request never fails the other requests of its batch.
+    """
+
+    def __init__(self, model, categorical_features, numeric_features, max_batch=256, max_wait_ms=2, window=10000):
+        self.model = model
+        self.categorical_features = categorical_features
+        self.numeric_features = numeric_features
+        self.features = categorical_features + numeric_features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen = window)
+        self.batch_sizes = deque(maxlen = window)
+        self.n_rows = 0
+        self.busy_time = 0.0
+        self.lock = threading.Lock()
+
+        threading.Thread(target = self._work, daemon = True).start()
+
+    def predict(self, rows):
+        """
+        Predicts a list of rows, blocking until its batch is predicted
+
+        Parameters:
+        rows -- (list) list of dictionaries with the features of each row
+
+        Returns:
+        predictions -- (list) predicted tier of each row
+        """
+        self.check_rows(rows)
+
+        # An empty request has nothing to wait for
+        if not rows:
+            return []
+
+        request = {'rows': rows, 'done': threading.Event(), 'start': time.time()}
+        self.requests.put(request)
+        request['done'].wait()
+
+        if 'error' in request:
+            raise PredictionError(str(request['error'])) from request['error']
+
+        return request['predictions']
+
+    def check_rows(self, rows):
+        """
+        Checks that every row has all the features, with a number (or null) in the numerical ones
+
+        Parameters:
+        rows -- (list) list of dictionaries with the features of each row
+        """
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ValueError(f"Each row must be a JSON object, got {json.dumps(row)}")
+
+            missing = [feature for feature in self.features if feature not in row]
+            if missing:
+                raise ValueError(f"Missing features: {', '.join(missing)}")
+
+            for feature in self.categorical_features:
+                if row[feature] is not None and not isinstance(row[feature], (str, bool, int, float)):
+                    raise ValueError(f"{feature} must be a single value or null, got {json.dumps(row[feature])}")
+
+            for feature in self.numeric_features:
+                # bool is a subclass of int, but true/false are not stats
+                if row[feature] is not None and (isinstance(row[feature], bool) or
+                                                 not isinstance(row[feature], (int, float))):
+                    raise ValueError(f"{feature} must be a number or null, got {json.dumps(row[feature])}")
+
+    def _work(self):
+        while True:
+            batch = [self.requests.get()]
+            n_rows = len(batch[0]['rows'])
+            deadline = time.time() + self.max_wait
+
+            while n_rows < self.max_batch:
+                try:
+                    request = self.requests.get(timeout = max(deadline - time.time(), 0))
+                except queue.Empty:
+                    break
+                batch.append(request)
+                n_rows += len(request['rows'])
+
+            start = time.time()
+            self._predict_batch(batch, n_rows)
+            with self.lock:
+                self.busy_time += time.time() - start
+
+    def _predict_rows(self, rows):
+        if hasattr(self.model, 'predict_records'):
+            # Compiled models predict the rows directly, without building a dataframe
+            return list(self.model.predict_records(rows))
+
+        X = pd.DataFrame.from_records(rows, columns = self.features)
+        # JSON nulls must look like the NaN read_csv gives, so the imputer fills them
+        X = X.where(X.notnull(), np.nan)
+
+        return list(self.model.predict(X))
+
+    def _predict_batch(self, batch, n_rows):
+        try:
+            predictions = self._predict_rows([row for request in batch for row in request['rows']])
+        except Exception as error:
+            if len(batch) == 1:
+                batch[0]['error'] = error
+                batch[0]['done'].set()
+                return
+
+            # One of the requests is bad, each request is predicted on its own so only that one fails
+            for request in batch:
+                self._predict_batch([request], len(request['rows']))
+            return
+
+        end = time.time()
+        i = 0
+
+        with self.lock:
+            for request in batch:
+                n = len(request['rows'])
+                request['predictions'] = [str(prediction) for prediction in predictions[i:i + n]]
+                i += n
+                self.latencies.append(end - request['start'])
+            self.batch_sizes.append(n_rows)
+            self.n_rows += n_rows
+
+        for request in batch:
+            request['done'].set()
+
+    def stats(self):
+        """
+        Reports latency percentiles and throughput since the server started. The throughput is measured over
+        the time spent predicting, so the idle time between requests does not lower it
+
+        Returns:
+        stats -- (dictionary) p50 and p99 latency in milliseconds, rows per second and mean batch size
+        """
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            batch_sizes = np.array(self.batch_sizes)
+            n_rows = self.n_rows
+            busy_time = self.busy_time
+
+        return {
+            'requests': len(latencies),
+            'rows': n_rows,
+            'p50_latency_ms': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+            'p99_latency_ms': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+            'rows_per_second': round(n_rows / busy_time, 1) if busy_time else None,
+            'mean_batch_size': round(float(batch_sizes.mean()), 2) if len(batch_sizes) else None
+        }
+
+def parse_rows(payload):
+    """
+    Turns a request payload (a row or a list of rows) into a list of rows
+
+    Parameters:
+    payload -- (dictionary or list) decoded JSON request
+
+    Returns:
+    rows -- (list) list of dictionaries
+    """
+    return [payload] if isinstance(payload, dict) else list(payload)
+
+def make_http_handler(batcher):
+    """
+    Creates the HTTP request handler of the server
+
+    Parameters:
+    batcher -- (MicroBatcher) batcher that predicts the requests
+
+    Returns:
+    handler -- (class) request handler class
+    """
+    class PredictionHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path != '/stats':
+                return self._reply(404, {'error': 'not found'})
+            self._reply(200, batcher.stats())
+
+        def do_POST(self):
+            if self.path != '/predict':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._reply(200, {'predictions': batcher.predict(parse_rows(payload))})
+            except PredictionError as error:
+                # The request was valid, the model failed
+                self._reply(500, {'error': str(error)})
+            except Exception as error:
+                self._reply(400, {'error': str(error)})
+
+        def _reply(self, status, body):
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            # Logging every request would cost more than predicting it
+            pass
+
+    return PredictionHandler
+
+def make_socket_handler(batcher):
+    """
+    Creates the Unix socket request handler of the server, one JSON request per line
+
+    Parameters:
+    batcher -- (MicroBatcher) batcher that predicts the requests
+
+    Returns:
+    handler -- (class) request handler class
+    """
+    class PredictionHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            for line in self.rfile:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    if line == b'stats':
+                        body = batcher.stats()
+                    else:
+                        body = {'predictions': batcher.predict(parse_rows(json.loads(line)))}
+                except Exception as error:
+                    body = {'error': str(error)}
+                self.wfile.write(json.dumps(body).encode() + b'\n')
+
+    return PredictionHandler
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--MODEL_DUMP_PATH"], opt["--HOST"], opt["--PORT"], opt["--SOCKET_PATH"], opt["--MAX_BATCH"],
+         opt["--MAX_WAIT_MS"], opt["--CATEGORICAL_FEATURES"], opt["--NUMERICAL_FEATURES"])
@@ -0,0 +1,170 @@
+'''Profiling of the stages of wrangling.py, eda.py and modeling.py (load, wrangle, fit, plot, ...).
+
+Each profiled stage, and each model evaluated by modeling.py, appends one JSON line to the profile file:
+    {"script": "modeling", "stage": "fit", "model": "kNN", "wall_time": 0.031, "cpu_time": 0.029, "peak_rss_mb": 112.4, ...}
+The peak RSS of a stage is the highest resident memory of the process while the stage ran. On Linux the peak
+is reset when a stage starts, elsewhere it is the peak of the process so far.
+
+One stage can also run under cProfile, its stats are dumped next to the profile file (e.g. profile_modeling_fit.prof)
+and can be read with pstats or snakeviz. Nothing is recorded while no profile file is configured.
+'''
+
+from contextlib import contextmanager
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+
+PROFILE = {'path': None, 'stage': None, 'script': None}
+
+# Peak RSS of each stage running in this process, innermost last
+PEAKS = []
+
+def configure_profile(profile_path, cprofile_stage='None', script=None):
+    """
+    Sets the profile file of the current process
+
+    Parameters:
+    profile_path -- (string) path of the JSON lines file, 'None' (or None) disables the profiling
+    cprofile_stage -- (string) name of the stage run under cProfile, 'None' for no stage
+    script -- (string) name of the script, written in every record
+    """
+    PROFILE['path'] = None if profile_path in [None, 'None'] else profile_path
+    PROFILE['stage'] = None if cprofile_stage in [None, 'None'] else cprofile_stage
+    PROFILE['script'] = script
+
+    if PROFILE['path'] and os.path.dirname(PROFILE['path']):
+        os.makedirs(os.path.dirname(PROFILE['path']), exist_ok = True)
+
+def reset_peak_memory():
+    """
+    Resets the peak resident memory of the current process, where the system allows it (Linux)
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as fp:
+            fp.write('5')
+    except OSError:
+        pass
+
+def peak_memory():
+    """
+    Returns the peak resident memory of the current process in MB
+    """
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+@contextmanager
+def measure():
+    """
+    Measures the wall time, CPU time and peak RSS of a block of code. Blocks can be nested,
+    the peak of the outer block includes the peaks of the inner ones
+
+    Yields:
+    metrics -- (dictionary) filled with wall_time, cpu_time and peak_rss_mb when the block ends
+    """
+    if PEAKS:
+        PEAKS[-1] = max(PEAKS[-1], peak_memory())
+    reset_peak_memory()
+    PEAKS.append(0.0)
+
+    metrics = {}
+    t = time.time()
+    c = time.process_time()
+
+    try:
+        yield metrics
+    finally:
+        metrics['wall_time'] = round(time.time() - t, 4)
+        metrics['cpu_time'] = round(time.process_time() - c, 4)
+        metrics['peak_rss_mb'] = round(max(PEAKS.pop(), peak_memory()), 1)
+        if PEAKS:
+            PEAKS[-1] = max(PEAKS[-1], metrics['peak_rss_mb'])
+
+def record(stage_name, **fields):
+    """
+    Appends a record to the profile file
+
+    Parameters:
+    stage_name -- (string) name of the stage
+    fields -- values of the record (e.g. model, wall_time, cpu_time, peak_rss_mb)
+    """
+    if PROFILE['path'] is None:
+        return
+
+    line = json.dumps({'script': PROFILE['script'], 'stage': stage_name, **fields,
+                       'pid': os.getpid(), 'time': round(time.time(), 3)})
+
+    with open(PROFILE['path'], 'a') as fp:
+        fp.write(line + '\n')
+
+@contextmanager
+def profile_stage(stage_name, **fields):
+    """
+    Profiles a stage of a script and records it, running it under cProfile if it is the chosen stage
+
+    Parameters:
+    stage_name -- (string) name of the stage
+    fields -- other values of the record (e.g. rows)
+    """
+    if PROFILE['path'] is None:
+        yield
+        return
+
+    profiler = cProfile.Profile() if stage_name == PROFILE['stage'] else None
+
+    with measure() as metrics:
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+    record(stage_name, **fields, **metrics)
+
+    if profiler is not None:
+        profiler.dump_stats(stats_path(stage_name))
+
+def stats_path(stage_name):
+    """
+    Path of the cProfile stats of a stage, next to the profile file
+
+    Parameters:
+    stage_name -- (string) name of the stage
+
+    Returns:
+    stats_path -- (string) path of the .prof file
+    """
+    root, _ = os.path.splitext(PROFILE['path'])
+
+    return f'{root}_{PROFILE["script"]}_{stage_name}.prof'
+
+def profiled_call(func, *args):
+    """
+    Calls a function and measures its peak RSS, e.g. in the process that fits a model
+
+    Parameters:
+    func -- (callable) function to call
+    args -- arguments passed to the function
+
+    Returns:
+    output -- output of the function
+    peak_rss_mb -- (float) peak resident memory in MB while the function ran
+    """
+    with measure() as metrics:
+        output = func(*args)
+
+    return output, metrics['peak_rss_mb']
@@ -0,0 +1,364 @@
+'''This script runs the whole pipeline: the wrangling of the Pokémon data and of the new generation, the EDA and the modeling.
+Each stage runs as soon as the stages it depends on are done, so independent stages run at the same time
+(the two wrangling runs, then the EDA and the modeling). A stage whose outputs are newer than all its inputs and than
+every script is skipped, and a stage whose outputs were restored from the stage cache is reported as restored.
+
+    wrangle ─────────┬──> eda
+                     └──> modeling
+    wrangle_new_gen ─────┘
+
+The append stages are not part of all and run only when they are asked for (STAGES=predict_appended). When the raw
+new generation csv changed, append_new_gen wrangles only its new rows into the wrangled file and a delta file, and
+predict_appended predicts the delta with the dumped model and appends it to the new generation predictions.
+
+    append_new_gen ──> predict_appended
+
+With IN_MEMORY=True the stages run in this process and the wrangled DataFrames go straight to the EDA and the
+modeling, so the train, test and new generation files are not written and parsed again.
+
+Usage: run_pipeline.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--NEW_GEN_FILE_PATH=<NEW_GEN_FILE_PATH>] [--STAGES=<STAGES>] [--MAX_WORKERS=<MAX_WORKERS>] [--FORCE=<FORCE>] [--N_JOBS=<N_JOBS>] [--USE_CACHE=<USE_CACHE>] [--IN_MEMORY=<IN_MEMORY>] [--SPLIT=<SPLIT>] [--PROFILE_PATH=<PROFILE_PATH>]
+
+Options:
+--DATA_FILE_PATH=<DATA_FILE_PATH>  Path (including filename) of the raw Pokémon csv. [default: data/pokemon_smogon_competitive.csv]
+--NEW_GEN_FILE_PATH=<NEW_GEN_FILE_PATH>  Path (including filename) of the raw new generation csv. [default: data/new_gen.csv]
+--STAGES=<STAGES>  String of the stages to run separated by commas (with the stages they depend on), all runs every stage but the append ones. [default: all]
+--MAX_WORKERS=<MAX_WORKERS>  Maximum number of stages running at the same time. [default: 2]
+--FORCE=<FORCE>  True to run the stages even if their outputs are up to date, False otherwise. [default: False]
+--N_JOBS=<N_JOBS>  Number of processes used by modeling.py to fit the models. [default: 1]
+--USE_CACHE=<USE_CACHE>  True to let each stage restore its outputs from the stage cache, False otherwise. [default: False]
+--IN_MEMORY=<IN_MEMORY>  True to run the stages in this process passing the DataFrames between them, False to run each script on its own. [default: False]
+--SPLIT=<SPLIT>  random or hash, how wrangling.py and modeling.py split the data (see splitting.py). [default: random]
+--PROFILE_PATH=<PROFILE_PATH>  Path of a JSON lines file where every stage appends the wall time, CPU time and peak memory of its steps (see profiling.py). None to disable the profiling. [default: None]
+'''
+
+from docopt import docopt
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from schema import STATS
+from stage_cache import RESTORED_MESSAGE, list_files
+
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+def main(data_file_path, new_gen_file_path, stages, max_workers, force, n_jobs, use_cache, in_memory='False', split='random',
+         profile_path='None'):
+    pipeline = make_stages(data_file_path, new_gen_file_path, n_jobs, use_cache, split, profile_path)
+    selected = select_stages(pipeline, stages)
+
+    print(f"Running the stages {', '.join(selected)}... \n", end='')
+    start = time.time()
+    if in_memory == 'True':
+        timings = run_in_memory(pipeline, selected, data_file_path, new_gen_file_path, n_jobs, split, profile_path)
+    else:
+        timings = run_stages(pipeline, selected, int(max_workers), force == 'True')
+    total_time = time.time() - start
+
+    summary = pd.DataFrame(timings).set_index('Stage')
+    print(summary.round(2))
+    print(f"Total wall time: {total_time:.2f} s (sum of the stages: {summary['Time in seconds'].sum():.2f} s)")
+
+    if (summary['Status'] == 'failed').any():
+        sys.exit("Pipeline failed")
+
+def make_stages(data_file_path, new_gen_file_path, n_jobs, use_cache, split='random', profile_path='None'):
+    """
+    Describes the stages of the pipeline with the default paths of each script
+
+    Parameters:
+    data_file_path -- (string) path of the raw Pokémon csv
+    new_gen_file_path -- (string) path of the raw new generation csv
+    n_jobs -- (string) number of processes used by modeling.py
+    use_cache -- (string) 'True' to let each stage use the stage cache
+    split -- (string) 'random' or 'hash', how the data is split
+    profile_path -- (string) path of the profile file of every stage, 'None' to disable the profiling
+
+    Returns:
+    stages -- (dictionary) command, data inputs, outputs and dependencies of each stage, and whether it
+    only runs when asked for. The scripts are inputs of every stage, so they are not listed
+    """
+    train_path = 'data/pokemon_smogon_competitive_train.csv'
+    test_path = 'data/pokemon_smogon_competitive_test.csv'
+    new_gen_path = 'data/new_gen_wrangled.csv'
+    delta_path = 'data/new_gen_delta.csv'
+    model_path = 'results/models/final_model.pic'
+    new_gen_prediction_path = 'results/pokemon_newgen_prediction.csv'
+    tier_mapping_path = 'data/tier_mapping.csv'
+    eda_path = 'results/figures/'
+
+    stages = {
+        'wrangle': {
+            'command': ['wrangling.py', f'--DATA_FILE_PATH={data_file_path}', f'--TRAIN_FILE_PATH={train_path}',
+                        f'--TEST_FILE_PATH={test_path}', f'--TIER_MAPPING_PATH={tier_mapping_path}',
+                        f'--SPLIT={split}', f'--USE_CACHE={use_cache}'],
+            'inputs': [data_file_path, tier_mapping_path],
+            'outputs': [train_path, test_path],
+            'depends': []
+        },
+        'wrangle_new_gen': {
+            'command': ['wrangling.py', f'--DATA_FILE_PATH={new_gen_file_path}', '--NEW_GEN=True',
+                        f'--NEW_GEN_PATH={new_gen_path}', f'--TIER_MAPPING_PATH={tier_mapping_path}',
+                        f'--USE_CACHE={use_cache}'],
+            'inputs': [new_gen_file_path, tier_mapping_path],
+            'outputs': [new_gen_path],
+            'depends': []
+        },
+        'eda': {
+            'command': ['eda.py', f'--DATA_FILE_PATH={train_path}', f'--EDA_FILE_PATH={eda_path}',
+                        f'--USE_CACHE={use_cache}'],
+            'inputs': [train_path],
+            'outputs': [f'{eda_path}corrplot.png'] + [f'{eda_path}{stat}.png' for stat in STATS],
+            'depends': ['wrangle']
+        },
+        'modeling': {
+            'command': ['modeling.py', f'--TRAIN_FILE_PATH={train_path}', f'--TEST_FILE_PATH={test_path}',
+                        f'--NEW_GEN_PATH={new_gen_path}', f'--N_JOBS={n_jobs}', f'--SPLIT={split}',
+                        f'--USE_CACHE={use_cache}'],
+            'inputs': [train_path, test_path, new_gen_path],
+            'outputs': ['results/pokemon_models.csv', 'results/pokemon_feature_importances.csv',
+                        model_path, 'results/figures/importance_plot.png',
+                        'results/pokemon_final_model.csv', 'results/pokemon_final_prediction.csv',
+                        new_gen_prediction_path],
+            'depends': ['wrangle', 'wrangle_new_gen']
+        },
+        'append_new_gen': {
+            'command': ['wrangling.py', f'--DATA_FILE_PATH={new_gen_file_path}', '--NEW_GEN=True', '--APPEND=True',
+                        f'--NEW_GEN_PATH={new_gen_path}', f'--DELTA_PATH={delta_path}',
+                        f'--TIER_MAPPING_PATH={tier_mapping_path}', f'--USE_CACHE={use_cache}'],
+            'inputs': [new_gen_file_path, tier_mapping_path],
+            'outputs': [new_gen_path, delta_path],
+            'depends': [],
+            'on_demand': True
+        },
+        'predict_appended': {
+            'command': ['modeling.py', '--PREDICT_ONLY=True', '--APPEND=True', f'--NEW_GEN_PATH={delta_path}',
+                        f'--MODEL_DUMP_PATH={model_path}', f'--NEWGEN_PREDICTION_PATH={new_gen_prediction_path}',
+                        f'--USE_CACHE={use_cache}'],
+            'inputs': [delta_path, model_path],
+            'outputs': [new_gen_prediction_path],
+            'depends': ['append_new_gen'],
+            'on_demand': True
+        }
+    }
+
+    for stage in stages.values():
+        stage['command'].append(f'--PROFILE_PATH={profile_path}')
+
+    return stages
+
+def select_stages(pipeline, stages):
+    """
+    Finds the stages to run, adding the stages they depend on
+
+    Parameters:
+    pipeline -- (dictionary) stages of the pipeline
+    stages -- (string) stages separated by commas, or 'all' for every stage but the ones that run on demand
+
+    Returns:
+    selected -- (list) stages to run, in the order of the pipeline
+    """
+    if stages == 'all':
+        return [stage for stage in pipeline if not pipeline[stage].get('on_demand', False)]
+
+    pending = stages.split(",")
+    selected = set()
+
+    while pending:
+        stage = pending.pop()
+        if stage not in pipeline:
+            raise ValueError(f"Unknown stage {stage}, the stages are {', '.join(pipeline)}")
+        if stage not in selected:
+            selected.add(stage)
+            pending.extend(pipeline[stage]['depends'])
+
+    return [stage for stage in pipeline if stage in selected]
+
+def is_up_to_date(stage):
+    """
+    Checks if every output of a stage exists and is newer than all its inputs and than every script.
+    The inputs can be folders or glob patterns of csv files, like the DATA_FILE_PATH of wrangling.py
+
+    Parameters:
+    stage -- (dictionary) command, inputs, outputs and dependencies of the stage
+
+    Returns:
+    up_to_date -- (bool) True if the stage can be skipped
+    """
+    from wrangling import list_data_files
+
+    outputs = stage['outputs']
+    inputs = list_files(SCRIPTS_PATH, '.py')
+
+    try:
+        for path in stage['inputs']:
+            inputs += list_data_files(path)
+    except AssertionError:
+        # A missing input, the stage runs and reports it
+        return False
+
+    if not all(os.path.isfile(path) for path in outputs):
+        return False
+
+    return min(os.path.getmtime(path) for path in outputs) >= max(os.path.getmtime(path) for path in inputs)
+
+def run_stage(name, stage):
+    """
+    Runs the script of a stage in its own process
+
+    Parameters:
+    name -- (string) name of the stage
+    stage -- (dictionary) command, inputs, outputs and dependencies of the stage
+
+    Returns:
+    timing -- (dictionary) status ('ran', 'restored' or 'failed') and wall time of the stage
+    """
+    command = [sys.executable, os.path.join(SCRIPTS_PATH, stage['command'][0])] + stage['command'][1:]
+
+    t = time.time()
+    process = subprocess.run(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True)
+    elapsed = time.time() - t
+
+    # The output is printed when the stage ends, so the logs of concurrent stages do not mix
+    print(f"----- {name} -----\n{process.stdout}", end='')
+
+    if process.returncode != 0:
+        status = 'failed'
+    elif RESTORED_MESSAGE in process.stdout:
+        status = 'restored'
+    else:
+        status = 'ran'
+
+    return {'Stage': name, 'Status': status, 'Time in seconds': elapsed}
+
+def run_stages(pipeline, selected, max_workers, force):
+    """
+    Runs the selected stages, each one as soon as its dependencies are done
+
+    Parameters:
+    pipeline -- (dictionary) stages of the pipeline
+    selected -- (list) stages to run
+    max_workers -- (int) maximum number of stages running at the same time
+    force -- (bool) True to run the stages even if they are up to date
+
+    Returns:
+    timings -- (list) status and wall time of each stage
+    """
+    waiting = list(selected)
+    done = {}
+    timings = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        while waiting or running:
+            for name in list(waiting):
+                depends = [stage for stage in pipeline[name]['depends'] if stage in selected]
+                if any(done.get(stage) in ['failed', 'not run'] for stage in depends):
+                    done[name] = 'not run'
+                    waiting.remove(name)
+                elif all(stage in done for stage in depends):
+                    waiting.remove(name)
+                    if not force and is_up_to_date(pipeline[name]):
+                        done[name] = 'skipped'
+                    else:
+                        running[executor.submit(run_stage, name, pipeline[name])] = name
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                timings[name] = future.result()
+                done[name] = timings[name]['Status']
+
+    return [timings.get(name, {'Stage': name, 'Status': done[name], 'Time in seconds': 0.0}) for name in selected]
+
+def run_in_memory(pipeline, selected, data_file_path, new_gen_file_path, n_jobs, split='random', profile_path='None'):
+    """
+    Runs the selected stages one after the other in this process, with the default paths of the scripts.
+    The wrangled DataFrames are passed to the next stages instead of being written to disk
+
+    Parameters:
+    pipeline -- (dictionary) stages of the pipeline
+    selected -- (list) stages to run, in the order of the pipeline
+    data_file_path -- (string) path of the raw Pokémon csv
+    new_gen_file_path -- (string) path of the raw new generation csv
+    n_jobs -- (string) number of processes used to fit the models
+    split -- (string) 'random' or 'hash', how the data is split
+    profile_path -- (string) path of the profile file, 'None' to disable the profiling
+
+    Returns:
+    timings -- (list) status and wall time of each stage
+    """
+    import wrangling
+    from profiling import configure_profile, profile_stage
+
+    tier_mapping = wrangling.load_tier_mapping('data/tier_mapping.csv')
+    frames = {}
+
+    def wrangle():
+        frames['train'], frames['test'] = wrangling.wrangle_data(data_file_path, 0.85, 'False', tier_mapping, split)
+
+    def wrangle_new_gen():
+        frames['new_gen'] = wrangling.wrangle_data(new_gen_file_path, 0.85, 'True', tier_mapping)
+
+    def eda():
+        import eda
+        eda.run_eda(frames['train'], 'results/figures/')
+
+    def modeling():
+        import modeling
+        modeling.run_modeling(frames['train'], frames['test'], frames['new_gen'], 
+                              'results/pokemon_models.csv', 'results/pokemon_feature_importances.csv',
+                              'results/models/final_model.pic', 'results/figures/importance_plot.png',
+                              'Type1,Type2,Mega,Has_ST', 'HP,Attack,Defense,Special_attack,Special_defense,Speed',
+                              'results/pokemon_final_model.csv', 'results/pokemon_final_prediction.csv',
+                              'results/pokemon_newgen_prediction.csv', n_jobs, split = split)
+
+    # The append stages read and write their files, like the scripts do
+
+    def append_new_gen():
+        wrangling.wrangle_new_rows(new_gen_file_path, 'data/new_gen_wrangled.csv', 'data/new_gen_delta.csv', tier_mapping)
+
+    def predict_appended():
+        import modeling
+        modeling.predict_only('results/models/final_model.pic', 'data/new_gen_delta.csv', 
+                              'results/pokemon_newgen_prediction.csv', 'Type1,Type2,Mega,Has_ST', 
+                              'HP,Attack,Defense,Special_attack,Special_defense,Speed', append = 'True')
+
+    steps = {'wrangle': wrangle, 'wrangle_new_gen': wrangle_new_gen, 'eda': eda, 'modeling': modeling,
+             'append_new_gen': append_new_gen, 'predict_appended': predict_appended}
+    done = {}
+    timings = []
+
+    for name in selected:
+        if any(done[stage] != 'ran' for stage in pipeline[name]['depends']):
+            done[name] = 'not run'
+            timings.append({'Stage': name, 'Status': 'not run', 'Time in seconds': 0.0})
+            continue
+
+        print(f"----- {name} -----")
+        t = time.time()
+        try:
+            # The records of the steps of a stage are written under the name of the stage
+            configure_profile(profile_path, 'None', name)
+            with profile_stage('total'):
+                steps[name]()
+            status = 'ran'
+        except Exception as error:
+            print(f"{name} failed: {error!r}")
+            status = 'failed'
+        done[name] = status
+        timings.append({'Stage': name, 'Status': status, 'Time in seconds': time.time() - t})
+
+    return timings
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--DATA_FILE_PATH"], opt["--NEW_GEN_FILE_PATH"], opt["--STAGES"], opt["--MAX_WORKERS"],
+         opt["--FORCE"], opt["--N_JOBS"], opt["--USE_CACHE"], opt["--IN_MEMORY"], opt["--SPLIT"],
+         opt["--PROFILE_PATH"])
@@ -0,0 +1,306 @@
+'''Schema of the raw and wrangled Pokémon data shared by wrangling.py, eda.py and modeling.py.
+
+The stats fit in uint8, Number and Total in int16, and the types and tiers are categoricals,
+so the loaded data uses several times less memory than with the dtypes pandas infers.
+
+Wrangled data can also be stored in columnar binary files, chosen by the file extension:
+    .csv      text, parsed on every read
+    .parquet  compressed columnar file (needs pyarrow)
+    .feather  compressed Arrow file (needs pyarrow)
+    .arrow    uncompressed Arrow file, memory-mapped and read without copying (needs pyarrow)
+The binary formats keep the dtypes, so no parsing or inference is needed (feather and arrow files store the
+categoricals as strings, which are turned back into categoricals when read). All of them can be written and
+read chunk by chunk.
+'''
+
+import os
+import pandas as pd
+
+STATS = ['HP', 'Attack', 'Defense', 'Special_attack', 'Special_defense', 'Speed']
+
+RAW_DTYPES = {
+    'X.': 'int16',
+    'Name': 'object',
+    'Type.1': 'category',
+    'Type.2': 'category',
+    'Total': 'int16',
+    'HP': 'uint8',
+    'Attack': 'uint8',
+    'Defense': 'uint8',
+    'Sp..Atk': 'uint8',
+    'Sp..Def': 'uint8',
+    'Speed': 'uint8',
+    'Generation': 'uint8',
+    'Legendary': 'bool',
+    'Mega': 'bool',
+    'Tier': 'category'
+}
+
+WRANGLED_DTYPES = {
+    'Number': 'int16',
+    'Name': 'object',
+    'Type1': 'category',
+    'Type2': 'category',
+    'Total': 'int16',
+    'HP': 'uint8',
+    'Attack': 'uint8',
+    'Defense': 'uint8',
+    'Special_attack': 'uint8',
+    'Special_defense': 'uint8',
+    'Speed': 'uint8',
+    'Generation': 'uint8',
+    'Legendary': 'bool',
+    'Mega': 'bool',
+    'Tier': 'category',
+    'Tier_2': 'category',
+    'Has_ST': 'category'
+}
+
+def read_raw(file_path, usecols=None, **kwargs):
+    """
+    Reads a raw csv (as downloaded) with the compact dtypes
+
+    Parameters:
+    file_path -- (string) path of the csv
+    usecols -- (list) columns to read, None reads all of them
+    kwargs -- other arguments of pd.read_csv (e.g. chunksize)
+
+    Returns:
+    data -- (dataframe) loaded data (or an iterator of dataframes if chunksize is given)
+    """
+    assert os.path.isfile(file_path), "File does not exist"
+
+    return pd.read_csv(file_path, usecols = usecols, dtype = select_dtypes(RAW_DTYPES, usecols), **kwargs)
+
+def check_raw_columns(file_path):
+    """
+    Checks that the header of a raw csv has the columns of the raw schema
+
+    Parameters:
+    file_path -- (string) path of the csv
+    """
+    columns = list(pd.read_csv(file_path, nrows = 0).columns)
+    missing = [column for column in RAW_DTYPES if column not in columns]
+    unexpected = [column for column in columns if column not in RAW_DTYPES]
+
+    if missing or unexpected:
+        raise ValueError(f"{file_path} does not match the raw schema (missing columns: {missing}, unexpected columns: {unexpected})")
+
+def file_format(file_path):
+    """
+    Finds the format of a wrangled file from its extension
+
+    Parameters:
+    file_path -- (string) path of the file
+
+    Returns:
+    file_format -- (string) 'csv', 'parquet', 'feather' or 'arrow'
+    """
+    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+
+    return extension if extension in ['parquet', 'feather', 'arrow'] else 'csv'
+
+def read_wrangled(file_path, usecols=None, chunksize=None, **kwargs):
+    """
+    Reads a wrangled file (written by wrangling.py) with the compact dtypes. In a csv the first column
+    is the index written by pandas, so it is used as the index instead of an 'Unnamed: 0' column
+
+    Parameters:
+    file_path -- (string) path of the csv, parquet, feather or arrow file
+    usecols -- (list) columns to read besides the index, None reads all of them
+    chunksize -- (int) number of rows of each chunk, None reads the whole file
+    kwargs -- other arguments of pd.read_csv, only used for csv files
+
+    Returns:
+    data -- (dataframe) loaded data (or an iterator of dataframes if chunksize is given)
+    """
+    assert os.path.isfile(file_path), "File does not exist"
+
+    if file_format(file_path) != 'csv':
+        return read_columnar(file_path, usecols, chunksize)
+
+    if usecols is not None:
+        index_column = pd.read_csv(file_path, nrows = 0).columns[0]
+        usecols = [index_column] + list(usecols)
+
+    return pd.read_csv(file_path, index_col = 0, usecols = usecols, chunksize = chunksize,
+                       dtype = select_dtypes(WRANGLED_DTYPES, usecols), **kwargs)
+
+def read_columnar(file_path, usecols=None, chunksize=None):
+    """
+    Reads a parquet, feather or arrow file. Arrow files are memory-mapped, so the columns
+    without missing values are used without copying them
+
+    Parameters:
+    file_path -- (string) path of the file
+    usecols -- (list) columns to read, None reads all of them
+    chunksize -- (int) number of rows of each chunk, None reads the whole file
+
+    Returns:
+    data -- (dataframe) loaded data (or an iterator of dataframes if chunksize is given)
+    """
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+
+    columns = None if usecols is None else list(usecols)
+
+    if file_format(file_path) == 'parquet':
+        if chunksize is not None:
+            batches = parquet.ParquetFile(file_path).iter_batches(batch_size = chunksize, columns = columns)
+            return (to_schema(batch.to_pandas()) for batch in batches)
+        table = parquet.read_table(file_path, columns = columns)
+    else:
+        if chunksize is not None:
+            return read_ipc_chunks(file_path, columns, chunksize)
+        table = feather.read_table(file_path, columns = columns, memory_map = True)
+
+    return to_schema(table.to_pandas(split_blocks = True))
+
+def read_ipc_chunks(file_path, columns, chunksize):
+    """
+    Reads a feather or arrow file one record batch at a time, so only the batches
+    of the current chunk are decompressed and in memory
+
+    Parameters:
+    file_path -- (string) path of the file
+    columns -- (list) columns to read, None reads all of them
+    chunksize -- (int) number of rows of each chunk
+
+    Returns:
+    chunks -- (generator) dataframes of chunksize rows (the last one can be smaller)
+    """
+    import pyarrow as pa
+
+    reader = pa.ipc.open_file(pa.memory_map(file_path))
+    buffered = None
+
+    for i in range(reader.num_record_batches):
+        batch = pa.Table.from_batches([reader.get_batch(i)])
+        if columns is not None:
+            batch = batch.select(columns)
+        buffered = batch if buffered is None else pa.concat_tables([buffered, batch])
+
+        while buffered.num_rows >= chunksize:
+            yield to_schema(buffered.slice(0, chunksize).to_pandas(split_blocks = True))
+            buffered = buffered.slice(chunksize)
+
+    if buffered is not None and buffered.num_rows > 0:
+        yield to_schema(buffered.to_pandas(split_blocks = True))
+
+def to_schema(data):
+    """
+    Casts the columns of a dataframe that are in the schema to their dtype
+
+    Parameters:
+    data -- (dataframe) wrangled data
+
+    Returns:
+    data -- (dataframe) data with the schema dtypes
+    """
+    dtypes = {column: dtype for column, dtype in WRANGLED_DTYPES.items() 
+              if column in data.columns and str(data[column].dtype) != dtype}
+
+    return data.astype(dtypes) if dtypes else data
+
+def write_wrangled(data, file_path):
+    """
+    Writes wrangled data in the format given by the extension of the file
+
+    Parameters:
+    data -- (dataframe) wrangled data
+    file_path -- (string) path of the csv, parquet, feather or arrow file
+    """
+    writer = WrangledWriter(file_path)
+    writer.write(data)
+    writer.close()
+
+def append_wrangled(data, file_path):
+    """
+    Appends rows to a wrangled file, creating it if it does not exist. csv files are appended in place,
+    the binary formats cannot grow so they are read and written again
+
+    Parameters:
+    data -- (dataframe) wrangled rows to append
+    file_path -- (string) path of the csv, parquet, feather or arrow file
+    """
+    if not os.path.isfile(file_path):
+        write_wrangled(data, file_path)
+    elif file_format(file_path) == 'csv':
+        to_schema(data).to_csv(file_path, mode = 'a', header = False)
+    else:
+        write_wrangled(pd.concat([read_wrangled(file_path), to_schema(data)]), file_path)
+
+class WrangledWriter:
+    """
+    Writes wrangled data chunk by chunk in the format given by the extension of the file, each chunk
+    as it arrives. Arrow IPC files (feather and arrow) cannot change their categories between chunks,
+    so their categorical columns are stored as strings and read back as categoricals by to_schema.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.format = file_format(file_path)
+        self.parquet_writer = None
+        self.ipc_writer = None
+        self.ipc_schema = None
+        self.started = False
+
+    def write(self, data):
+        data = to_schema(data)
+
+        if self.format == 'csv':
+            data.to_csv(self.file_path, mode = 'a' if self.started else 'w', header = not self.started)
+        elif self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as parquet
+
+            if self.parquet_writer is None:
+                table = pa.Table.from_pandas(data, preserve_index = True)
+                self.parquet_writer = parquet.ParquetWriter(self.file_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(data, schema = self.parquet_writer.schema, preserve_index = True)
+            self.parquet_writer.write_table(table)
+        else:
+            self.write_ipc(data)
+
+        self.started = True
+
+    def write_ipc(self, data):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(data, preserve_index = True)
+
+        if self.ipc_writer is None:
+            # The schema of the first chunk, with strings instead of dictionaries (or of nulls,
+            # for a column whose values are all missing in the first chunk)
+            self.ipc_schema = pa.schema([field.with_type(pa.string()) 
+                                         if pa.types.is_dictionary(field.type) or pa.types.is_null(field.type) else field 
+                                         for field in table.schema], metadata = table.schema.metadata)
+            compression = 'lz4' if self.format == 'feather' and pa.Codec.is_available('lz4') else None
+            self.ipc_writer = pa.ipc.new_file(self.file_path, self.ipc_schema, 
+                                              options = pa.ipc.IpcWriteOptions(compression = compression))
+
+        self.ipc_writer.write_table(table.cast(self.ipc_schema))
+
+    def close(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+        if self.ipc_writer is not None:
+            self.ipc_writer.close()
+
+def select_dtypes(dtypes, usecols):
+    """
+    Keeps the dtypes of the columns that are read
+
+    Parameters:
+    dtypes -- (dictionary) dtype of each column of the schema
+    usecols -- (list) columns to read, None for all of them
+
+    Returns:
+    dtypes -- (dictionary) dtype of each column to read
+    """
+    if usecols is None:
+        return dtypes
+
+    return {column: dtype for column, dtype in dtypes.items() if column in usecols}
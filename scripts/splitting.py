@@ -0,0 +1,50 @@
+'''Deterministic splits by a hash of the identity of each Pokémon (its Number and Name).
+
+A row always lands in the same part whatever the other rows are, so adding Pokémon to the data
+only adds rows to the splits and does not move the rows that were already there.
+Each split uses its own hash key, so the train/validation split of modeling.py is independent
+of the train/test split of wrangling.py.
+'''
+
+import numpy as np
+import pandas as pd
+
+ID_COLUMNS = ['Number', 'Name']
+
+# Keys of pd.util.hash_pandas_object, they must be 16 characters long
+TEST_SPLIT_KEY = '0123456789123456'
+VALID_SPLIT_KEY = 'pokemon_valid_01'
+
+def in_first_part(ids, train_size, hash_key=TEST_SPLIT_KEY):
+    """
+    Assigns each row to the first part of a split with a hash of its identity
+
+    Parameters:
+    ids -- (dataframe) identity columns of each row (e.g. Number and Name)
+    train_size -- (float) expected share of rows in the first part
+    hash_key -- (string) 16 characters key of the hash, a different key gives an independent split
+
+    Returns:
+    in_first -- (array) boolean array, True for the rows of the first part
+    """
+    hashes = pd.util.hash_pandas_object(ids, index = False, hash_key = hash_key).to_numpy()
+
+    return hashes / 2.0**64 < float(train_size)
+
+def hash_split(data, train_size, id_columns=ID_COLUMNS, hash_key=TEST_SPLIT_KEY):
+    """
+    Splits a dataframe in two parts with a hash of the identity of each row
+
+    Parameters:
+    data -- (dataframe) data with the identity columns
+    train_size -- (float) expected share of rows in the first part
+    id_columns -- (list) columns identifying a row
+    hash_key -- (string) 16 characters key of the hash
+
+    Returns:
+    first -- (dataframe) first part of the data (e.g. train)
+    second -- (dataframe) second part of the data (e.g. test)
+    """
+    in_first = in_first_part(data[id_columns], train_size, hash_key)
+
+    return data[in_first], data[~in_first]
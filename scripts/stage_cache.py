@@ -0,0 +1,149 @@
+'''Content-addressed cache of the outputs of a pipeline stage (wrangling, eda or modeling).
+
+A stage is identified by a hash of its input files, its docopt options and the code of the scripts.
+When the same hash was already computed, its outputs are copied back instead of running the stage again.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+
+from feature_store import file_digest, save_entry
+
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Options that change where the cache is (or what is profiled), not what a stage computes
+CACHE_OPTIONS = ['--USE_CACHE', '--CACHE_DIR', '--PROFILE_PATH', '--PROFILE_STAGE']
+
+# Printed by a stage whose outputs were restored, so run_pipeline.py can tell it did not run
+RESTORED_MESSAGE = 'outputs restored from the cache'
+
+def stage_key(stage_name, input_paths, options):
+    """
+    Hashes the input files, the options and the code of a stage
+
+    Parameters:
+    stage_name -- (string) name of the stage
+    input_paths -- (list) input files (or folders) of the stage
+    options -- (dictionary) docopt options of the stage
+
+    Returns:
+    key -- (string) hexadecimal hash
+    """
+    hasher = hashlib.sha256(stage_name.encode())
+
+    for input_path in input_paths:
+        hasher.update(input_path.encode())
+        for file_path in list_files(input_path):
+            file_digest(file_path, hasher)
+
+    for file_path in list_files(SCRIPTS_PATH, '.py'):
+        file_digest(file_path, hasher)
+
+    options = {option: value for option, value in options.items() if option not in CACHE_OPTIONS}
+    hasher.update(json.dumps(options, sort_keys = True).encode())
+
+    return hasher.hexdigest()
+
+def list_files(path, extension=''):
+    """
+    Lists a file, or the files inside a folder, in a stable order
+
+    Parameters:
+    path -- (string) file or folder
+    extension -- (string) only keep files with this extension
+
+    Returns:
+    file_paths -- (list) list of file paths
+    """
+    if os.path.isfile(path):
+        return [path]
+
+    return sorted(os.path.join(root, file_name)
+                  for root, _, file_names in os.walk(path)
+                  for file_name in file_names if file_name.endswith(extension))
+
+def restore_outputs(cache_dir, key, output_paths):
+    """
+    Copies the cached outputs of a key to their paths
+
+    Parameters:
+    cache_dir -- (string) folder of the cache
+    key -- (string) key of the stage
+    output_paths -- (list) output files of the stage
+
+    Returns:
+    hit -- (bool) True if the outputs were restored
+    """
+    entry_path = os.path.join(cache_dir, key)
+    manifest_path = os.path.join(entry_path, 'manifest.json')
+
+    if not os.path.isfile(manifest_path):
+        return False
+
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+
+    if sorted(manifest) != sorted(output_paths):
+        return False
+
+    for output_path, file_name in manifest.items():
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok = True)
+        shutil.copyfile(os.path.join(entry_path, file_name), output_path)
+
+    return True
+
+def store_outputs(cache_dir, key, output_paths):
+    """
+    Copies the outputs of a stage to the cache
+
+    Parameters:
+    cache_dir -- (string) folder of the cache
+    key -- (string) key of the stage
+    output_paths -- (list) output files of the stage
+    """
+    def write_files(entry_path):
+        manifest = {}
+
+        for i, output_path in enumerate(output_paths):
+            manifest[output_path] = str(i)
+            shutil.copyfile(output_path, os.path.join(entry_path, str(i)))
+
+        with open(os.path.join(entry_path, 'manifest.json'), 'w') as fp:
+            json.dump(manifest, fp)
+
+    # An entry with other outputs (e.g. from other options of the stage) is replaced
+    save_entry(cache_dir, key, write_files, replace = True)
+
+def run_cached(stage_name, input_paths, output_paths, options, compute, cache_dir, use_cache='True'):
+    """
+    Runs a stage, or restores its outputs if the same inputs and options were already run
+
+    Parameters:
+    stage_name -- (string) name of the stage
+    input_paths -- (list) input files (or folders) of the stage
+    output_paths -- (list) output files of the stage
+    options -- (dictionary) docopt options of the stage
+    compute -- (callable) function that runs the stage
+    cache_dir -- (string) folder of the cache
+    use_cache -- (string) 'True' to use the cache, anything else just runs the stage
+
+    Returns:
+    hit -- (bool) True if the outputs were restored from the cache
+    """
+    if use_cache != 'True':
+        compute()
+        return False
+
+    key = stage_key(stage_name, input_paths, options)
+
+    if restore_outputs(cache_dir, key, output_paths):
+        print(f"{stage_name}: inputs unchanged, {RESTORED_MESSAGE} ({key[:12]})")
+        return True
+
+    compute()
+    store_outputs(cache_dir, key, output_paths)
+
+    return False
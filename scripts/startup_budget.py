@@ -0,0 +1,91 @@
+'''This script checks the startup budget of modeling.py. It measures the time of `modeling.py --help` and of a
+predict-only run, and checks that the heavy libraries are not loaded when the script is imported.
+It exits with an error if any of the checks fails.
+
+Usage: startup_budget.py [--HELP_BUDGET=<HELP_BUDGET>] [--PREDICT_BUDGET=<PREDICT_BUDGET>] [--REPEATS=<REPEATS>] [--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>] [--NEW_GEN_PATH=<NEW_GEN_PATH>]
+
+Options:
+--HELP_BUDGET=<HELP_BUDGET>  Maximum seconds allowed for `modeling.py --help`. [default: 1.5]
+--PREDICT_BUDGET=<PREDICT_BUDGET>  Maximum seconds allowed for a predict-only run. [default: 4]
+--REPEATS=<REPEATS>  Number of runs of each command, the best time is kept. [default: 3]
+--MODEL_DUMP_PATH=<MODEL_DUMP_PATH>  Path of the dumped final model used in the predict-only run. [default: results/models/final_model.pic]
+--NEW_GEN_PATH=<NEW_GEN_PATH>  Path to the wrangled new generation csv used in the predict-only run. [default: data/new_gen_wrangled.csv]
+'''
+
+from docopt import docopt
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+MODELING_PATH = os.path.join(SCRIPTS_PATH, 'modeling.py')
+
+# Libraries that must only be loaded when a model or a plot needs them
+HEAVY_MODULES = ['lightgbm', 'xgboost', 'altair', 'selenium', 'webdriver_manager']
+
+def main(help_budget, predict_budget, repeats, model_dump_path, new_gen_path):
+    checks = []
+
+    print("Checking the imports of modeling.py... \n", end='')
+    loaded = loaded_heavy_modules()
+    print(f"Heavy modules loaded at import: {loaded}")
+    checks.append(not loaded)
+
+    help_time = best_time([sys.executable, MODELING_PATH, '--help'], int(repeats))
+    print(f"modeling.py --help: {help_time:.3f} s (budget {float(help_budget)} s)")
+    checks.append(help_time <= float(help_budget))
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        predict_time = best_time([sys.executable, MODELING_PATH, '--PREDICT_ONLY=True',
+                                  f'--MODEL_DUMP_PATH={model_dump_path}',
+                                  f'--NEW_GEN_PATH={new_gen_path}',
+                                  f'--NEWGEN_PREDICTION_PATH={os.path.join(tmp_path, "prediction.csv")}'],
+                                 int(repeats))
+    print(f"modeling.py --PREDICT_ONLY=True: {predict_time:.3f} s (budget {float(predict_budget)} s)")
+    checks.append(predict_time <= float(predict_budget))
+
+    if not all(checks):
+        sys.exit("Startup budget exceeded")
+
+    print("Startup budget - OK")
+
+def loaded_heavy_modules():
+    """
+    Imports modeling.py in a fresh interpreter and lists the heavy modules it loaded
+
+    Returns:
+    loaded -- (list) heavy modules loaded by the import
+    """
+    code = (f"import sys; sys.path.insert(0, {SCRIPTS_PATH!r}); "
+            f"import modeling; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], check = True,
+                            stdout = subprocess.PIPE, universal_newlines = True).stdout
+
+    return [module for module in output.strip().split(',') if module]
+
+def best_time(command, repeats):
+    """
+    Runs a command several times and returns its best wall time
+
+    Parameters:
+    command -- (list) command to run
+    repeats -- (int) number of runs
+
+    Returns:
+    best -- (float) best wall time in seconds
+    """
+    times = []
+
+    for _ in range(repeats):
+        t = time.time()
+        subprocess.run(command, check = True, stdout = subprocess.DEVNULL)
+        times.append(time.time() - t)
+
+    return min(times)
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--HELP_BUDGET"], opt["--PREDICT_BUDGET"], opt["--REPEATS"],
+         opt["--MODEL_DUMP_PATH"], opt["--NEW_GEN_PATH"])
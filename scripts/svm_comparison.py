@@ -0,0 +1,101 @@
+'''This script compares the exact RBF SVM models of modeling.py with their kernel approximations
+(--SVM_MODE=nystroem and --SVM_MODE=rff). Each model is fitted in every mode on the same preprocessed
+train and validation matrices, and its accuracies, fit time and prediction time are saved with the change
+against the exact model. The train rows can be repeated SCALE times, with noise on the numerical features
+of the copies, to see how each mode grows with the data.
+
+Usage: svm_comparison.py [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>] [--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>] [--SCALE=<SCALE>] [--JITTER=<JITTER>] [--COMPARISON_PATH=<COMPARISON_PATH>]
+
+Options:
+--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>  Path (including filename) to gather the csv (or parquet, feather, arrow) file. [default: data/pokemon_smogon_competitive_train.csv]
+--CATEGORICAL_FEATURES=<CATEGORICAL_FEATURES>  String of categorical features separated by commas [default: Type1,Type2,Mega,Has_ST]
+--NUMERICAL_FEATURES=<NUMERICAL_FEATURES>  String of numerical features separated by commas [default: HP,Attack,Defense,Special_attack,Special_defense,Speed]
+--SCALE=<SCALE>  Number of times the train rows are repeated before fitting. [default: 1]
+--JITTER=<JITTER>  Relative standard deviation of the noise multiplied into the numerical features of the repeated rows, so they are not exact duplicates. [default: 0.2]
+--COMPARISON_PATH=<COMPARISON_PATH>  Path to output the comparison table. [default: results/svm_comparison.csv]
+'''
+
+from docopt import docopt
+import os
+import time
+
+import pandas as pd
+
+from approximate_svm import SVM_MODES
+from benchmark import scale_data
+from modeling import data_splitting, make_model, preprocessing, transform_data
+from schema import read_wrangled
+
+SVM_MODELS = ['OVR - RBF SVM', 'OVO - RBF SVM']
+
+def main(data_file_path, cat_features, num_features, scale, jitter, comparison_path):
+    assert os.path.isfile(data_file_path), "TRAIN_FILE_PATH does not exist"
+
+    categorical_features = cat_features.split(",")
+    numeric_features = num_features.split(",")
+    all_features = categorical_features + numeric_features
+
+    data = read_wrangled(data_file_path, usecols = all_features + ['Tier_2'])
+    X_valid, X_train, y_valid, y_train = data_splitting(data[all_features], data['Tier_2'], 0.7)
+
+    X_train, y_train = scale_data(X_train, y_train, int(scale), numeric_features, float(jitter))
+
+    print(f"Transforming the data ({len(X_train)} train rows)... \n", end='')
+    matrices = transform_data(preprocessing(categorical_features, numeric_features),
+                              {'train': X_train, 'valid': X_valid})
+
+    comparison = compare_modes(matrices['train'], y_train, matrices['valid'], y_valid)
+
+    if os.path.dirname(comparison_path):
+        os.makedirs(os.path.dirname(comparison_path), exist_ok = True)
+    comparison.to_csv(comparison_path, index = False)
+    print(comparison)
+
+def compare_modes(X_train, y_train, X_valid, y_valid):
+    """
+    Fits the RBF SVM models in every SVM mode and compares them with the exact ones
+
+    Parameters:
+    X_train -- (matrix) transformed train X
+    y_train -- (series) train y
+    X_valid -- (matrix) transformed validation X
+    y_valid -- (series) validation y
+
+    Returns:
+    comparison -- (dataframe) accuracies and timings of each model and mode, and their change against the exact mode
+    """
+    rows = []
+
+    for model_name in SVM_MODELS:
+        for svm_mode in SVM_MODES:
+            print(f"Fitting {model_name} ({svm_mode})... \n", end='')
+            model = make_model(model_name, svm_mode)
+
+            start = time.perf_counter()
+            model.fit(X_train, y_train)
+            fit_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            valid_pred = model.predict(X_valid)
+            predict_time = time.perf_counter() - start
+
+            rows.append([model_name, svm_mode, len(y_train),
+                         round(model.score(X_train, y_train), 3), round((valid_pred == y_valid).mean(), 3),
+                         round(fit_time, 4), round(predict_time, 4)])
+
+    comparison = pd.DataFrame(rows, columns = ['Model', 'SVM mode', 'Train rows', 'Train Accuracy',
+                                               'Validation Accuracy', 'Fit time in seconds',
+                                               'Predict time in seconds'])
+
+    exact = comparison[comparison['SVM mode'] == 'exact'].set_index('Model')
+    comparison['Validation Accuracy change'] = (comparison['Validation Accuracy'] -
+                                                comparison['Model'].map(exact['Validation Accuracy'])).round(3)
+    comparison['Fit speedup'] = (comparison['Model'].map(exact['Fit time in seconds']) /
+                                 comparison['Fit time in seconds']).round(2)
+
+    return comparison
+
+if __name__ == "__main__":
+    opt = docopt(__doc__)
+    main(opt["--TRAIN_FILE_PATH"], opt["--CATEGORICAL_FEATURES"], opt["--NUMERICAL_FEATURES"],
+         opt["--SCALE"], opt["--JITTER"], opt["--COMPARISON_PATH"])
@@ -0,0 +1,226 @@
+'''Hyperparameter search with successive halving for the models of modeling.py.
+
+Each model starts with a set of random configurations fitted on a small stratified part of the train rows.
+After each round only the best 1/ETA configurations of each model are kept and fitted on ETA times more rows,
+until one configuration per model is left or all the train rows are used. The configurations are scored in a
+stratified part of the train rows held out from the fits, so the validation set of modeling.py only reports the
+tuned models and does not choose their parameters.
+
+The fits of a round (all models and configurations) run at the same time. A fit that takes longer than the
+timeout, or is still running when the global time budget is spent, is stopped and its configuration dropped,
+and no new round starts once the budget is spent.
+'''
+
+import json
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from parallel import SHARED, run_parallel
+
+# Parameters of the wrapped estimator of the OVR and OVO models start with estimator__
+PARAM_GRIDS = {
+    'decision tree': {'max_depth': [3, 5, 8, 12, None], 'min_samples_leaf': [1, 2, 5, 10]},
+    'kNN': {'n_neighbors': [3, 5, 9, 15, 25, 35], 'weights': ['uniform', 'distance']},
+    'OVR - logistic regression': {'estimator__C': [0.01, 0.1, 1, 10, 100]},
+    'OVO - logistic regression': {'estimator__C': [0.01, 0.1, 1, 10, 100]},
+    'OVR - RBF SVM': {'estimator__C': [0.1, 1, 10, 100], 'estimator__gamma': ['scale', 0.01, 0.1, 1]},
+    'OVO - RBF SVM': {'estimator__C': [0.1, 1, 10, 100], 'estimator__gamma': ['scale', 0.01, 0.1, 1]},
+    'random forest': {'n_estimators': [15, 50, 100, 200], 'max_depth': [3, 5, 8, None], 'min_samples_leaf': [1, 2, 5]},
+    'xgboost': {'n_estimators': [30, 100, 200], 'max_depth': [2, 3, 5], 'learning_rate': [0.03, 0.1, 0.3]},
+    'lgbm': {'n_estimators': [15, 50, 100], 'max_depth': [3, 5, -1], 'num_leaves': [7, 15, 31], 'learning_rate': [0.05, 0.1]}
+}
+
+ETA = 3
+
+# Smallest number of rows a configuration is fitted on
+MIN_ROWS = 30
+
+# Share of the train rows held out to score the configurations
+HOLDOUT = 0.25
+
+def sample_configs(param_grid, n_configs, random_state=1234):
+    """
+    Draws distinct random configurations from a grid
+
+    Parameters:
+    param_grid -- (dictionary) list of values of each parameter
+    n_configs -- (int) maximum number of configurations
+    random_state -- (int) seed of the draw
+
+    Returns:
+    configs -- (list) list of parameter dictionaries
+    """
+    from sklearn.model_selection import ParameterSampler
+
+    n_configs = min(n_configs, int(np.prod([len(values) for values in param_grid.values()])))
+
+    return list(ParameterSampler(param_grid, n_configs, random_state = random_state))
+
+def stratified_order(y, random_state=1234):
+    """
+    Orders the rows so that every prefix has about the same class proportions as y
+
+    Parameters:
+    y -- (series) response variable
+    random_state -- (int) seed of the shuffle
+
+    Returns:
+    order -- (array) positions of the rows
+    """
+    rng = np.random.RandomState(random_state)
+    shuffled = pd.Series(np.asarray(y)).iloc[rng.permutation(len(y))]
+
+    # Position of each row within its class, relative to the size of the class
+    rank = (shuffled.groupby(shuffled).cumcount() + 0.5) / shuffled.map(shuffled.value_counts())
+
+    return shuffled.index.to_numpy()[np.argsort(rank.to_numpy(), kind = 'stable')]
+
+def score_config(model, rows):
+    """
+    Fits a configured model on some train rows and scores it in the held out train rows. The matrices are read
+    from the data shared with the process. A configuration that cannot be fitted on the rows of the round
+    (e.g. more neighbors than rows) has no score and returns the error instead
+
+    Parameters:
+    model -- (model object) unfitted model with the parameters of the configuration
+    rows -- (array) positions of the train rows of the round
+
+    Returns:
+    holdout_acc -- (float) accuracy in the held out train rows, None if the configuration failed
+    error -- (string) error message of a failed configuration, None if it was scored
+    """
+    X_train, y_train, holdout = SHARED['X_train'], SHARED['y_train'], SHARED['holdout']
+
+    try:
+        model.fit(X_train[rows], y_train.iloc[rows])
+        return model.score(X_train[holdout], y_train.iloc[holdout]), None
+    except ValueError as error:
+        return None, str(error)
+
+def tune_models(models, X_train, y_train, budget, n_configs=16, n_jobs=1, random_state=1234, timeout=None, deadline=None):
+    """
+    Tunes a group of models with successive halving under a global time budget. The configurations are
+    scored in a held out part of the train rows, so the validation set stays out of the tuning
+
+    Parameters:
+    models -- (dictionary) models dictionary, models without a grid in PARAM_GRIDS are not tuned
+    X_train -- (matrix) transformed train X
+    y_train -- (series) train y
+    budget -- (float) seconds the tuning may take, the fits still running then are stopped
+    n_configs -- (int) number of configurations of each model in the first round
+    n_jobs -- (int) number of fits at the same time
+    random_state -- (int) seed of the configurations and of the row order
+    timeout -- (float) seconds each fit may take, None for no limit
+    deadline -- (float) time.time() after which the tuning stops even if its budget is not spent, None for no limit
+
+    Returns:
+    best_params -- (dataframe) best configuration of each model and its holdout accuracy, with the status 'tuned',
+    or 'failed' ('timed out') when none of its configurations could be fitted (finished in time)
+    trace -- (dataframe) holdout accuracy, fit time, status ('ok', 'failed' or 'timed out') and error of every 
+    configuration in every round
+    """
+    from sklearn.base import clone
+
+    deadline = min(time.time() + budget, deadline or float('inf'))
+    order = stratified_order(y_train, random_state)
+
+    # The first rows of the stratified order are held out, the other ones are fitted on
+    n_holdout = int(len(order) * HOLDOUT)
+    holdout, order = order[:n_holdout], order[n_holdout:]
+    n_rows = len(order)
+    shared = {'X_train': X_train, 'y_train': y_train, 'holdout': holdout}
+
+    candidates = {model_name: sample_configs(PARAM_GRIDS[model_name], n_configs, random_state)
+                  for model_name in models if model_name in PARAM_GRIDS}
+    n_rounds = min(math.ceil(math.log(max(len(configs) for configs in candidates.values()), ETA)),
+                   int(math.log(max(n_rows / MIN_ROWS, 1), ETA))) + 1
+    trace = []
+
+    for round_number in range(n_rounds):
+        if time.time() >= deadline:
+            print(f"Tuning budget spent, stopping before round {round_number}")
+            break
+
+        # The rows grow ETA times each round, the last round uses all of them
+        rows = order[:n_rows // ETA**(n_rounds - 1 - round_number)]
+
+        tasks = [(model_name, params) for model_name, configs in candidates.items() for params in configs]
+        outputs = run_parallel(score_config, [(clone(models[model_name]).set_params(**params), rows)
+                                              for model_name, params in tasks], n_jobs, timeout, deadline, shared)
+
+        # The fits that timed out have no output, the ones that failed have an error and no accuracy
+
+        round_trace = pd.DataFrame([[model_name, round_number, len(rows), json.dumps(params), *config_status(output),
+                                     round(elapsed_time, 4)]
+                                    for (model_name, params), (output, elapsed_time, _) in zip(tasks, outputs)],
+                                   columns = ['Model', 'Round', 'Rows', 'Params', 'Holdout Accuracy', 'Status', 'Error',
+                                              'Time in seconds'])
+        trace.append(round_trace)
+        print(f"Round {round_number}: {len(tasks)} configurations fitted on {len(rows)} rows")
+
+        for failed in round_trace[round_trace['Status'] == 'failed'].itertuples():
+            print(f"Warning: {failed.Model} with {failed.Params} failed on {failed.Rows} rows: {failed.Error}")
+
+        # Keeping the best 1/ETA configurations of each model, the ones that timed out or failed are dropped
+
+        for model_name in list(candidates):
+            scores = round_trace[round_trace['Model'] == model_name]
+            keep = max(len(scores) // ETA, 1)
+            best = scores.dropna(subset = ['Holdout Accuracy'])\
+                         .sort_values('Holdout Accuracy', ascending = False, kind = 'stable')\
+                         .head(keep)
+            candidates[model_name] = [json.loads(params) for params in best['Params']]
+            if not candidates[model_name]:
+                del candidates[model_name]
+
+        if not candidates:
+            break
+
+    trace = pd.concat(trace, ignore_index = True) if trace else pd.DataFrame(columns = ['Model', 'Round', 'Rows', 'Params', 
+                                                                                        'Holdout Accuracy', 'Status', 'Error',
+                                                                                        'Time in seconds'])
+
+    # The best configuration of each model is the best one of the last round it was scored in,
+    # the models without any scored configuration are reported as failed or timed out and keep their fixed parameters
+
+    scored = trace.dropna(subset = ['Holdout Accuracy'])
+    last_round = scored[scored['Round'] == scored.groupby('Model')['Round'].transform('max')]
+    best_params = last_round.sort_values('Holdout Accuracy', ascending = False, kind = 'stable')\
+                            .drop_duplicates('Model')\
+                            .set_index('Model')\
+                            .assign(Status = 'tuned')
+
+    for model_name, statuses in trace.groupby('Model')['Status']:
+        if model_name not in best_params.index:
+            status = 'failed' if (statuses == 'failed').all() else 'timed out'
+            print(f"Warning: no configuration of {model_name} was scored ({status}), it keeps its fixed parameters")
+            best_params.loc[model_name, 'Status'] = status
+
+    best_params = best_params.loc[[model_name for model_name in models if model_name in best_params.index], 
+                                  ['Params', 'Rows', 'Holdout Accuracy', 'Status']]
+
+    return best_params, trace
+
+def config_status(output):
+    """
+    Turns the output of score_config into the accuracy, status and error of a configuration
+
+    Parameters:
+    output -- (tuple) holdout accuracy and error returned by score_config, None if the fit timed out
+
+    Returns:
+    holdout_acc -- (float) rounded holdout accuracy, NaN if the configuration was not scored
+    status -- (string) 'ok', 'failed' or 'timed out'
+    error -- (string) error message of a failed configuration, None otherwise
+    """
+    if output is None:
+        return np.nan, 'timed out', None
+
+    holdout_acc, error = output
+    if error is not None:
+        return np.nan, 'failed', error
+
+    return round(holdout_acc, 3), 'ok', None
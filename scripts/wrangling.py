@@ -2,70 +2,231 @@
 # date: 2020-02-23
 
 '''This script wrangles and splits the data for ML purposes. It takes the following arguments as inputs: 
-    the path were the root file is,
+    the path were the root file is (a csv, a folder of csvs or a glob pattern),
     the path where the test and train dataset are going to be saved, 
     the train/test set split in decimal numbers
-    a boolean variable indicating if the dataset contains the new generation (unlabeled data)
-    and a path to print the wrangled new gen dataset
+    a boolean variable indicating if the dataset contains the new generation (unlabeled data),
+    a path to print the wrangled new gen dataset,
+    the path of the csv that maps each tier to its tier group,
+    the number of rows wrangled at a time (streaming mode),
+    how the rows are split (randomly or by a hash of their Number and Name)
+    and, for the new generation, whether only the new rows are wrangled and appended
 
-Usage: wrangling.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--TEST_FILE_PATH=<TEST_FILE_PATH>] [--TRAIN_SIZE=<TRAIN_SIZE>] [--NEW_GEN=<NEW_GEN>] [--NEW_GEN_PATH=<NEW_GEN_PATH>]
+Usage: wrangling.py [--DATA_FILE_PATH=<DATA_FILE_PATH>] [--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>] [--TEST_FILE_PATH=<TEST_FILE_PATH>] [--TRAIN_SIZE=<TRAIN_SIZE>] [--NEW_GEN=<NEW_GEN>] [--NEW_GEN_PATH=<NEW_GEN_PATH>] [--TIER_MAPPING_PATH=<TIER_MAPPING_PATH>] [--CHUNK_SIZE=<CHUNK_SIZE>] [--SPLIT=<SPLIT>] [--APPEND=<APPEND>] [--DELTA_PATH=<DELTA_PATH>] [--N_JOBS=<N_JOBS>] [--PROFILE_PATH=<PROFILE_PATH>] [--PROFILE_STAGE=<PROFILE_STAGE>] [--USE_CACHE=<USE_CACHE>] [--CACHE_DIR=<CACHE_DIR>]
 
 Options:
---DATA_FILE_PATH=<DATA_FILE_PATH>       Path (including filename) to retrieve the csv file. [default: data/pokemon_smogon_competitive.csv]
---TRAIN_FILE_PATH=<TRAIN_FILE_PATH>     Path (including filename) to print the train portion as a csv file. [default: data/pokemon_smogon_competitive_train.csv]
---TEST_FILE_PATH=<TEST_FILE_PATH>       Path (including filename) to print the test portion as a csv file. [default: data/pokemon_smogon_competitive_test.csv]
+--DATA_FILE_PATH=<DATA_FILE_PATH>       Path (including filename) to retrieve the csv file, or a folder or glob pattern (e.g. "data/raw/gen_*.csv") of csv files that are merged and deduplicated by Number and Name. [default: data/pokemon_smogon_competitive.csv]
+--TRAIN_FILE_PATH=<TRAIN_FILE_PATH>     Path (including filename) to print the train portion as a csv, parquet, feather or arrow file (chosen by extension). [default: data/pokemon_smogon_competitive_train.csv]
+--TEST_FILE_PATH=<TEST_FILE_PATH>       Path (including filename) to print the test portion as a csv, parquet, feather or arrow file (chosen by extension). [default: data/pokemon_smogon_competitive_test.csv]
 --TRAIN_SIZE=<TRAIN_SIZE>               Decimal value for the train/test split. [default: 0.85]
 --NEW_GEN=<NEW_GEN>                     TRUE if the dataset contains info about the new generation (final test), FALSE otherwise [default: False]
---NEW_GEN_PATH=<NEW_GEN_PATH>           Path (including filename) to print the wrangled new gen dataset as a csv file. This only applies if NEW_GEN is True [default: data/new_gen_wrangled.csv]
+--NEW_GEN_PATH=<NEW_GEN_PATH>           Path (including filename) to print the wrangled new gen dataset as a csv, parquet, feather or arrow file (chosen by extension). This only applies if NEW_GEN is True [default: data/new_gen_wrangled.csv]
+--TIER_MAPPING_PATH=<TIER_MAPPING_PATH>  Path (including filename) of the csv with the Tier and Tier_2 columns that maps each tier to its group. [default: data/tier_mapping.csv]
+--CHUNK_SIZE=<CHUNK_SIZE>               Number of rows read, wrangled and written at a time. Rows are assigned to train or test by a hash of their Number and Name. 0 wrangles the whole file at once [default: 0]
+--SPLIT=<SPLIT>                         random to split with train_test_split, hash to assign each row by a hash of its Number and Name so adding rows does not move the others. Chunks are always split by hash [default: random]
+--APPEND=<APPEND>                       True to wrangle only the rows of the new gen dataset whose Number and Name are not in NEW_GEN_PATH yet, and append them to it. This only applies if NEW_GEN is True [default: False]
+--DELTA_PATH=<DELTA_PATH>               Path (including filename) to print the rows appended in APPEND mode, so only they are predicted (modeling.py --PREDICT_ONLY=True --APPEND=True). [default: data/new_gen_delta.csv]
+--N_JOBS=<N_JOBS>                       Number of processes loading the csv files when DATA_FILE_PATH has several of them, -1 uses all cores. [default: -1]
+--PROFILE_PATH=<PROFILE_PATH>           Path of a JSON lines file where the wall time, CPU time and peak memory of each stage (load, wrangle, split, save, wrangle_stream) are appended (see profiling.py). None to disable the profiling. [default: None]
+--PROFILE_STAGE=<PROFILE_STAGE>         Name of a stage run under cProfile, its stats are dumped next to PROFILE_PATH. None for no stage. [default: None]
+--USE_CACHE=<USE_CACHE>                 True to restore the outputs from the stage cache when the inputs and options did not change, False otherwise. [default: False]
+--CACHE_DIR=<CACHE_DIR>                 Folder of the stage cache. [default: results/.stage_cache/]
 '''
 
 import os
+import glob
+import numpy as np
 import pandas as pd
 from sklearn.model_selection import train_test_split 
 from docopt import docopt
+from schema import read_raw, read_wrangled, write_wrangled, append_wrangled, WrangledWriter, to_schema
+from schema import RAW_DTYPES, check_raw_columns
+from splitting import ID_COLUMNS, hash_split
+from parallel import run_parallel
+from profiling import configure_profile, profile_stage
+from stage_cache import run_cached
 
-opt = docopt(__doc__)
 
-
-def main(data_file_path, train_file_path, test_file_path, train_size, new_gen, new_gen_path):
+def main(data_file_path, train_file_path, test_file_path, train_size, new_gen, new_gen_path, tier_mapping_path, chunk_size=0, split='random',
+         append='False', delta_path='data/new_gen_delta.csv', n_jobs=-1):
     """
     Main entry for the data download script.
 
     Arguments
     ---------
     data_file_path : str
-        File path (including filename) to retrieve the data file from.
+        File path (including filename), folder or glob pattern to retrieve the data files from.
     train_file_path : str
         File path (including filename) to print the train portion of the data.
     test_file_path : str
         File path (including filename) to print the test portion of the data.
     train_size : float
         Size of the train dataset.
+    new_gen : str
+        'True' if the dataset contains the new generation, 'False' otherwise.
+    new_gen_path : str
+        File path (including filename) to print the wrangled new gen data.
+    tier_mapping_path : str
+        File path (including filename) of the tier mapping csv.
+    chunk_size : int
+        Number of rows wrangled at a time, 0 wrangles the whole file at once.
+    split : str
+        'random' to split with train_test_split, 'hash' to split by a hash of the Number and Name.
+    append : str
+        'True' to only wrangle and append the new gen rows that are not in new_gen_path yet.
+    delta_path : str
+        File path (including filename) to print the appended rows.
+    n_jobs : int
+        Number of processes loading the data files, -1 uses all cores.
     """
-    print("Checking the path of the data... \n", end='')
-    loaded_df = load_data(data_file_path)
-    print("Wrangling the data... \n", end='')    
-    wrangled_df = wrangling(loaded_df)
+    tier_mapping = load_tier_mapping(tier_mapping_path)
+
+    if (new_gen == 'True' and append == 'True'):
+        wrangle_new_rows(data_file_path, new_gen_path, delta_path, tier_mapping, n_jobs)
+        return
+
+    if int(chunk_size) > 0:
+        print("Wrangling the data by chunks... \n", end='')
+        with profile_stage('wrangle_stream'):
+            wrangling_stream(data_file_path, train_file_path, test_file_path, train_size, 
+                             new_gen, new_gen_path, tier_mapping, int(chunk_size))
+        return
+
+    wrangled = wrangle_data(data_file_path, train_size, new_gen, tier_mapping, split, n_jobs)
     
     # This portion is for the original dataset
     if (new_gen == 'False'):
-        print("Splitting the data... \n", end='')
-        train, test = train_test_split(wrangled_df, train_size = float(train_size), test_size = 1 - float(train_size), random_state = 2020)
+        train, test = wrangled
 
-        print("Saving the train data... \n", end='')
-        train.to_csv(train_file_path)
-        print("Saving the test data... \n", end='')
-        test.to_csv( test_file_path)
+        with profile_stage('save'):
+            print("Saving the train data... \n", end='')
+            write_wrangled(train, train_file_path)
+            print("Saving the test data... \n", end='')
+            write_wrangled(test, test_file_path)
 
     else:
         print("Saving the new gen data... \n", end='')
-        wrangled_df.to_csv(new_gen_path)
+        with profile_stage('save'):
+            write_wrangled(wrangled, new_gen_path)
+
+def wrangle_new_rows(data_file_path, new_gen_path, delta_path, tier_mapping, n_jobs=-1):
+    """
+    Wrangles only the new gen rows that are not in the wrangled file yet, appends them to it
+    and writes them to a delta file. A row is identified by its Number and Name.
+
+    Arguments
+    ---------
+    data_file_path : str
+        File path (including filename), folder or glob pattern to retrieve the new gen data from.
+    new_gen_path : str
+        File path (including filename) of the wrangled new gen data, created if it does not exist.
+    delta_path : str
+        File path (including filename) to print the appended rows.
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
+    n_jobs : int
+        Number of processes loading the data files, -1 uses all cores.
+
+    Returns
+    ---------
+    n_rows : int
+        Number of appended rows.
+    """
+    print("Checking the path of the data... \n", end='')
+    with profile_stage('load'):
+        loaded_df = load_data(data_file_path, n_jobs)
+
+        if os.path.isfile(new_gen_path):
+            known = read_wrangled(new_gen_path, usecols = ID_COLUMNS)
+            known_ids = pd.MultiIndex.from_frame(known[ID_COLUMNS].astype({'Number': 'int64'}))
+            ids = pd.MultiIndex.from_frame(loaded_df[['X.', 'Name']].astype({'X.': 'int64'}))
+            loaded_df = loaded_df[~ids.isin(known_ids)]
+
+    print(f"Wrangling {len(loaded_df)} new rows... \n", end='')
+    with profile_stage('wrangle', rows = len(loaded_df)):
+        wrangled_df = to_schema(wrangling(loaded_df, tier_mapping))
 
-        
+    print("Appending the new rows to the new gen data... \n", end='')
+    with profile_stage('save'):
+        append_wrangled(wrangled_df, new_gen_path)
+        write_wrangled(wrangled_df, delta_path)
 
-def load_data(data_file_path):
+    return(len(wrangled_df))
+
+def wrangle_data(data_file_path, train_size, new_gen, tier_mapping, split='random', n_jobs=-1):
     """
-    Loads the data given a data file path.
+    Loads, wrangles and splits the data in memory, without writing it. This is the 
+    library entry used by run_pipeline.py to pass the DataFrames to the modeling.
+
+    Arguments
+    ---------
+    data_file_path : str
+        File path (including filename), folder or glob pattern to retrieve the data files from.
+    train_size : float
+        Size of the train dataset.
+    new_gen : str
+        'True' if the dataset contains the new generation, 'False' otherwise.
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
+    split : str
+        'random' to split with train_test_split, 'hash' to split by a hash of the Number and Name.
+    n_jobs : int
+        Number of processes loading the data files, -1 uses all cores.
+
+    Returns
+    ---------
+    data : tuple or pandas dataframe
+        (train, test) dataframes, or the wrangled new gen dataframe if new_gen is 'True'.
+    """
+    print("Checking the path of the data... \n", end='')
+    with profile_stage('load'):
+        loaded_df = load_data(data_file_path, n_jobs)
+    print("Wrangling the data... \n", end='')    
+    with profile_stage('wrangle', rows = len(loaded_df)):
+        wrangled_df = to_schema(wrangling(loaded_df, tier_mapping))
+
+    if (new_gen != 'False'):
+        return(wrangled_df)
+
+    print("Splitting the data... \n", end='')
+    with profile_stage('split'):
+        if (split == 'hash'):
+            return(hash_split(wrangled_df, float(train_size)))
+
+        train, test = train_test_split(wrangled_df, train_size = float(train_size), random_state = 2020)
+
+    return(train, test)
+
+
+def list_data_files(data_file_path):
+    """
+    Lists the data files given a file path, a folder or a glob pattern.
+
+    Arguments
+    ---------
+    data_file_path : str
+        File path (including filename), folder (all its csv files) or glob pattern.
+
+    Returns
+    ---------
+    file_paths : list
+        Sorted list of the data files.
+    """
+    if os.path.isdir(data_file_path):
+        file_paths = glob.glob(os.path.join(data_file_path, '*.csv'))
+    elif glob.has_magic(data_file_path):
+        file_paths = glob.glob(data_file_path)
+    else:
+        file_paths = [data_file_path]
+
+    file_paths = sorted(file_paths)
+    assert file_paths and all(os.path.isfile(file_path) for file_path in file_paths), "File does not exist"
+
+    return(file_paths)
+
+def load_file(data_file_path):
+    """
+    Loads one raw data file after checking its columns against the raw schema.
 
     Arguments
     ---------
@@ -77,11 +238,148 @@ def load_data(data_file_path):
     data : pandas dataframe
         Loaded data as a pandas dataframe.
     """
-    assert os.path.isfile(data_file_path), "File does not exist"
-    
-    return(pd.read_csv(data_file_path))
+    check_raw_columns(data_file_path)
 
-def wrangling(data):
+    return(read_raw(data_file_path))
+
+def load_data(data_file_path, n_jobs=-1):
+    """
+    Loads the data given a data file path, a folder or a glob pattern. Several files are 
+    loaded in a process pool and merged, keeping the first row of each Number and Name.
+
+    Arguments
+    ---------
+    data_file_path : str
+        File path (including filename), folder or glob pattern to retrieve the data files from.
+    n_jobs : int
+        Number of processes loading the files, -1 uses all cores.
+
+    Returns
+    ---------
+    data : pandas dataframe
+        Loaded data as a pandas dataframe.
+    """
+    file_paths = list_data_files(data_file_path)
+
+    if len(file_paths) == 1:
+        return(read_raw(file_paths[0]))
+
+    print(f"Loading {len(file_paths)} files... \n", end='')
+    loaded = run_parallel(load_file, [(file_path,) for file_path in file_paths], n_jobs)
+
+    # Files with different categories are concatenated as objects, so the categoricals are cast again
+    data = pd.concat([data for data, _, _ in loaded], ignore_index = True)
+    data = data.astype({column: dtype for column, dtype in RAW_DTYPES.items() if dtype == 'category'})
+
+    n_rows = len(data)
+    data = data.drop_duplicates(subset = ['X.', 'Name']).reset_index(drop = True)
+    print(f"{n_rows - len(data)} duplicated rows dropped")
+
+    return(data)
+
+def wrangling_stream(data_file_path, train_file_path, test_file_path, train_size, new_gen, new_gen_path, tier_mapping, chunk_size):
+    """
+    Wrangles the data chunk by chunk and appends each chunk to the output files, so the 
+    memory used does not depend on the size of the input. Each row goes to train or test 
+    with hash_split, which does not need to see the whole dataset.
+
+    Arguments
+    ---------
+    data_file_path : str
+        File path (including filename), folder or glob pattern to retrieve the data files from.
+    train_file_path : str
+        File path (including filename) to print the train portion of the data.
+    test_file_path : str
+        File path (including filename) to print the test portion of the data.
+    train_size : float
+        Size of the train dataset.
+    new_gen : str
+        'True' if the dataset contains the new generation, 'False' otherwise.
+    new_gen_path : str
+        File path (including filename) to print the wrangled new gen data.
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
+    chunk_size : int
+        Number of rows wrangled at a time.
+    """
+    file_paths = list_data_files(data_file_path)
+
+    if (new_gen == 'False'):
+        writers = {'train': WrangledWriter(train_file_path), 'test': WrangledWriter(test_file_path)}
+    else:
+        writers = {'new_gen': WrangledWriter(new_gen_path)}
+
+    n_rows = 0
+
+    # Rows are not deduplicated between files in streaming mode
+    chunks = (chunk for file_path in file_paths for chunk in read_raw(file_path, chunksize = chunk_size))
+
+    for chunk in chunks:
+        wrangled_df = wrangling(chunk, tier_mapping)
+
+        if (new_gen == 'False'):
+            train, test = hash_split(wrangled_df, float(train_size))
+            writers['train'].write(train)
+            writers['test'].write(test)
+        else:
+            writers['new_gen'].write(wrangled_df)
+
+        n_rows += len(chunk)
+
+    for writer in writers.values():
+        writer.close()
+
+    print(f"{n_rows} rows wrangled \n", end='')
+
+def load_tier_mapping(tier_mapping_path):
+    """
+    Loads the tier mapping given its file path.
+
+    Arguments
+    ---------
+    tier_mapping_path : str
+        File path (including filename) of a csv with the Tier and Tier_2 columns.
+
+    Returns
+    ---------
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
+    """
+    assert os.path.isfile(tier_mapping_path), "Tier mapping file does not exist"
+
+    mapping = pd.read_csv(tier_mapping_path)
+
+    return(dict(zip(mapping['Tier'], mapping['Tier_2'])))
+
+def map_tiers(tiers, tier_mapping):
+    """
+    Maps each tier to its group in one vectorized pass over the category codes.
+    Tiers that are not in the mapping keep their value.
+
+    Arguments
+    ---------
+    tiers : pandas series
+        Tier of each Pokémon.
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
+
+    Returns
+    ---------
+    tier_groups : pandas categorical
+        Tier group of each Pokémon. Every group of the mapping is a category, so
+        separately wrangled parts of a dataset share the same categories.
+    """
+    tiers = tiers.astype('category')
+    groups = [tier_mapping.get(tier, tier) for tier in tiers.cat.categories]
+    categories = pd.unique(pd.Series(list(tier_mapping.values()) + groups, dtype = object))
+
+    # Code of the group of each tier category, -1 (missing) stays missing
+    group_codes = pd.Index(categories).get_indexer(groups)
+    codes = tiers.cat.codes.to_numpy()
+
+    return(pd.Categorical.from_codes(np.where(codes >= 0, group_codes[codes], -1), categories))
+
+def wrangling(data, tier_mapping):
     """
     Wrangles and splits the data.
 
@@ -89,31 +387,19 @@ def wrangling(data):
     ---------
     data : Pandas Dataframe
         Pandas dataframe for the data wrangling and split.
+    tier_mapping : dict
+        Dictionary mapping each tier to its tier group.
 
     Returns
     ---------
     data : pandas dataframe
         Wrangled dataset.
     """
-    # Ubers
-    data['Tier_2'] = data['Tier'].str.replace("^AG$", "AG - Ubers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^Uber$", "AG - Ubers")
-
-    # Upper tier
-    data['Tier_2'] = data['Tier_2'].str.replace("^OU$", "Upper Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^BL$", "Upper Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^UU$", "Upper Tiers")
-
-    # Lower tier
-    data['Tier_2'] = data['Tier_2'].str.replace("^BL2$", "Lower Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^RU$", "Lower Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^BL3$", "Lower Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^NU$", "Lower Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^BL4$", "Lower Tiers")
-    data['Tier_2'] = data['Tier_2'].str.replace("^PU$", "Lower Tiers")
+    # Tier groups (Ubers, Upper tiers and Lower tiers)
+    data['Tier_2'] = map_tiers(data['Tier'], tier_mapping)
 
     # Has Sencodary Type?
-    data['Has_ST'] = data['Type.2'].apply(lambda x: 'No' if pd.isnull(x) else 'Yes')
+    data['Has_ST'] = np.where(data['Type.2'].isnull(), 'No', 'Yes')
     
     data = data.rename(columns = {'X.': 'Number',
                                   'Type.1': 'Type1',
@@ -124,9 +410,33 @@ def wrangling(data):
     return(data)
 
 if __name__ == "__main__":
-    main(opt["--DATA_FILE_PATH"],
-         opt["--TRAIN_FILE_PATH"],
-         opt["--TEST_FILE_PATH"],
-         opt["--TRAIN_SIZE"],
-         opt["--NEW_GEN"],
-         opt["--NEW_GEN_PATH"])
+    opt = docopt(__doc__)
+
+    input_paths = list_data_files(opt["--DATA_FILE_PATH"]) + [opt["--TIER_MAPPING_PATH"]]
+
+    if opt["--NEW_GEN"] == 'False':
+        output_paths = [opt["--TRAIN_FILE_PATH"], opt["--TEST_FILE_PATH"]]
+    elif opt["--APPEND"] == 'True':
+        # The rows already wrangled are an input of the append
+        input_paths += [opt["--NEW_GEN_PATH"]] if os.path.isfile(opt["--NEW_GEN_PATH"]) else []
+        output_paths = [opt["--NEW_GEN_PATH"], opt["--DELTA_PATH"]]
+    else:
+        output_paths = [opt["--NEW_GEN_PATH"]]
+
+    configure_profile(opt["--PROFILE_PATH"], opt["--PROFILE_STAGE"], 'wrangling')
+
+    with profile_stage('total'):
+        run_cached('wrangling', input_paths, output_paths, opt,
+                   lambda: main(opt["--DATA_FILE_PATH"],
+                                opt["--TRAIN_FILE_PATH"],
+                                opt["--TEST_FILE_PATH"],
+                                opt["--TRAIN_SIZE"],
+                                opt["--NEW_GEN"],
+                                opt["--NEW_GEN_PATH"],
+                                opt["--TIER_MAPPING_PATH"],
+                                opt["--CHUNK_SIZE"],
+                                opt["--SPLIT"],
+                                opt["--APPEND"],
+                                opt["--DELTA_PATH"],
+                                opt["--N_JOBS"]),
+                   opt["--CACHE_DIR"], opt["--USE_CACHE"])